@@ -9,4 +9,5 @@ REDIS_URL = os.environ.get("REDIS_URL")
 mail = Mail()
 db = SQLAlchemy()
 bcrypt = Bcrypt()
-jwt_redis_blocklist = redis.StrictRedis.from_url(REDIS_URL, decode_responses=True)
+redis_client = redis.StrictRedis.from_url(REDIS_URL, decode_responses=True)
+jwt_redis_blocklist = redis_client
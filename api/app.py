@@ -1,8 +1,19 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from flasgger import Swagger
 from os import environ
-from . import db, bcrypt, jwt_redis_blocklist, mail
+from . import db, bcrypt, redis_client, mail, metrics
+from .bench import bench
+from .blocklist import token_blocklist
+from .cache import mark_dashboard_stale, refresh_user_count
+from .compression import compress
+from .engine import database_role, engine_options, watch_statement_timeouts
+from .lease import LeaderLease
+from .pagination import InvalidCursor
+from .passwords import password_hasher
+from .search import search_cli
+from .serializers import InvalidFields
+from .notifications import email_dispatcher, email_templates, smtp_pool
 from .config import Config
 from .views import app_views
 from flask_migrate import Migrate
@@ -12,15 +23,23 @@ from flask_jwt_extended import (
     get_jwt_identity,
     get_jwt,
 )
-from datetime import timedelta, date, datetime
-from models.medication import Medication
-from models.user import User
+from datetime import timedelta, datetime
+from models.appointment import Appointment
+from models.base_model import local_now
+from models.medication import Medication, ACTIVE_STATUSES, DOSE_WINDOW, period_for
 from models.doctor import Doctor
+from models.email_outbox import EmailOutbox
 from flask_mail import Message
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.executors.pool import ThreadPoolExecutor
 
+import atexit
+from functools import wraps
+import redis
 from threading import Event
+import time
 from colorama import Fore, Style, init
 
 
@@ -29,7 +48,19 @@ app.config.from_object(Config)
 bcrypt.init_app(app)
 jwt = JWTManager(app)
 mail.init_app(app)
+email_dispatcher.init_app(app)
+smtp_pool.init_app(app)
+email_templates.init_app(app)
+compress.init_app(app)
+token_blocklist.init_app(app)
+password_hasher.init_app(app)
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    **engine_options(app.config),
+    **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+}
 db.init_app(app)
+with app.app_context():
+    watch_statement_timeouts(db.engine, app.config)
 migrate = Migrate(app, db)
 
 
@@ -39,26 +70,55 @@ app.config["JWT_SECRET_KEY"] = "shsuy3y9e8hhw##4tlytyskb}{FG{}}"
 app.register_blueprint(app_views)
 
 scheduler = BackgroundScheduler(
-    executors={"default": ThreadPoolExecutor(max_workers=6)}
+    executors={
+        "default": ThreadPoolExecutor(max_workers=app.config["SCHEDULER_THREADS"])
+    }
 )
-scheduler.start()
 stop_event = Event()
 # Initialize colorama
 init(autoreset=True)
 
 
 def add_token_to_blocklist(jti, expires_in):
-    jwt_redis_blocklist.setex(jti, expires_in, "true")
+    token_blocklist.revoke(jti, expires_in)
 
 
 @jwt.token_in_blocklist_loader
 def check_if_token_in_blocklist(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-    token_in_redis = jwt_redis_blocklist.get(jti)
-    return token_in_redis is not None
+    return token_blocklist.is_revoked(jwt_payload["jti"])
 
 
 # Error handlers
+@app.errorhandler(InvalidCursor)
+def invalid_cursor_callback(error):
+    return (
+        jsonify(
+            {
+                "status": False,
+                "statusCode": 400,
+                "error": "INVALID_CURSOR",
+                "msg": "The cursor is invalid or was issued for another listing.",
+            }
+        ),
+        400,
+    )
+
+
+@app.errorhandler(InvalidFields)
+def invalid_fields_callback(error):
+    return (
+        jsonify(
+            {
+                "status": False,
+                "statusCode": 400,
+                "error": "INVALID_FIELDS",
+                "msg": f"Unknown or empty fields requested: {error}",
+            }
+        ),
+        400,
+    )
+
+
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
     token_type = jwt_payload["type"]
@@ -120,6 +180,25 @@ def logout():
     return jsonify({"message": "User successfully logged out"}), 200
 
 
+@app.route("/metrics", methods=["GET"])
+@jwt_required()
+def get_metrics():
+    """Counters, gauges and timings recorded by this process, for SuperAdmins."""
+    if get_jwt().get("role") != "SuperAdmin":
+        return (
+            jsonify(
+                {
+                    "error": "UNAUTHORIZED",
+                    "status": False,
+                    "statusCode": 403,
+                    "msg": "You are not authorized to view the metrics.",
+                }
+            ),
+            403,
+        )
+    return jsonify(metrics.snapshot()), 200
+
+
 def log_message(message, color):
     """
     Print a formatted log message to the terminal with the specified color.
@@ -145,267 +224,444 @@ def send_email(name, to, subject, body, template_name="email_template.html", **k
     msg = Message(subject, recipients=[to])
 
     # Render the HTML template with dynamic content
-    msg.html = render_template(
+    msg.html = email_templates.render(
         template_name, subject=subject, body=body, name=name, **kwargs
     )
 
-    # Send the email
-    mail.send(msg)
+    # Send the email over a pooled SMTP session
+    smtp_pool.send(msg)
     log_message(f"Email sent to {to} with subject: '{subject}'", Fore.GREEN)
 
 
-def check_medications():
-    with app.app_context():
-        # Current time with an offset for your timezone
-        now = (datetime.utcnow() + timedelta(hours=1)).time()
-
-        # Define time slots and their names
-        time_slots = {
-            "morning": (8, 12),  # 8:00 AM to 11:59 AM
-            "afternoon": (12, 18),  # 12:00 PM to 5:59 PM
-            "night": (18, 24),  # 6:00 PM to 11:59 PM
-        }
-
-        # Determine current time slot based on current hour
-        current_hour = now.hour
-        current_period = None
-        for period, (start, end) in time_slots.items():
-            if start <= current_hour < end:
-                current_period = period
-                break
-
-        log_message("Checking medications for emails...", Fore.YELLOW)
-
-        medications = Medication.query.filter(
-            ((Medication.status == "upcoming") | (Medication.status == "ongoing"))
-        ).all()
-
-        for medication in medications:
-            for schedule in medication.duration:
-                try:
-                    scheduled_time = datetime.strptime(schedule["time"], "%H:%M").time()
-                    period_for_schedule = schedule.get("when").lower()
-                except (KeyError, ValueError):
-                    log_message(
-                        f"Invalid time format in duration: {schedule}", Fore.RED
-                    )
-                    continue
-
-                # Ensure the scheduled time period matches the current period and hasn't been sent today
-                if (
-                    current_period
-                    and period_for_schedule == current_period
-                    and medication.last_sent_period != current_period
-                ):
-                    # Check if current time matches scheduled time within 5 minutes
-                    if (
-                        abs(
-                            (
-                                datetime.combine(date.today(), scheduled_time)
-                                - datetime.combine(date.today(), now)
-                            ).total_seconds()
-                        )
-                        <= 300
-                    ):
-                        user = User.query.get(medication.user_id)
-                        log_message(
-                            f"Medication reminder for {user.email} - {medication.name} at {scheduled_time.strftime('%I:%M %p')} - current time: {now}",
-                            Fore.BLUE,
-                        )
-
-                        if medication.count_left > 0:
-                            email_body = (
-                                f"Hey {user.full_name},\n\n"
-                                f"🎉 It's time to take your {medication.name}! 🎉\n\n"
-                                f"🕒 Scheduled Time: {scheduled_time.strftime('%I:%M %p')}\n"
-                                f"💊 Count Left: {medication.count_left}\n\n"
-                                "Cheers to good health!\nThe HealthCare Team 😊"
-                            )
-
-                            send_email(
-                                to=user.email,
-                                name=user.full_name,
-                                subject=f"Time to Take Your Medication: {medication.name}",
-                                body=email_body,
-                                footer="Stay healthy and keep smiling!",
-                                current_year=datetime.now().year,
-                            )
-
-                            # Update medication status and decrement count
-                            medication.status = "ongoing"
-                            medication.count_left -= 1
-                            medication.last_sent_period = (
-                                current_period  # Mark period as sent
-                            )
-
-                            if medication.count_left == 0:
-                                congratulatory_email_body = (
-                                    f"Congratulations, {user.full_name}! 🎉\n\n"
-                                    f"You've completed your course of {medication.name}!\n\n"
-                                    "Cheers to your health and well-being!\nThe HealthCare Team 😊"
-                                )
-                                send_email(
-                                    to=user.email,
-                                    name=user.full_name,
-                                    subject=f"Congrats on Completing Your Medication: {medication.name}!",
-                                    body=congratulatory_email_body,
-                                    footer="Keep up the great work!",
-                                    current_year=datetime.now().year,
-                                )
-                                medication.status = "completed"
-
-                            db.session.commit()
+def scheduled_job(seconds):
+    """
+    Turn a function into a scheduler job that runs every `seconds`.
 
+    Every process schedules the job, but on each tick only the holder of the
+    job's Redis lease runs it. The lease outlives a couple of missed ticks, so
+    if the leader dies another process takes over once it expires. The job
+    runs inside an app context and records how long it took and how many
+    statements it sent to the database.
+    """
 
-# Function to update appointment statuses and send notifications
-def check_appointments():
-    from datetime import datetime
-    from models.appointment import Appointment
-    from models.user import User
+    def decorator(func):
+        lease = LeaderLease(
+            redis_client, f"scheduler:{func.__name__}", ttl_seconds=seconds * 2 + 10
+        )
 
-    with app.app_context():
-        now = datetime.utcnow()
-        now = now + timedelta(hours=1)
+        @wraps(func)
+        def wrapper():
+            try:
+                is_leader = lease.acquire()
+            except redis.RedisError as e:
+                log_message(f"Skipping {func.__name__}, no lease: {e}", Fore.RED)
+                return
+            if not is_leader:
+                return
+
+            with app.app_context(), database_role("worker"):
+                started = time.perf_counter()
+                with metrics.count_queries(db.engine) as queries:
+                    func()
+                metrics.set_gauge(f"scheduler.{func.__name__}.queries", queries.count)
+                metrics.observe(
+                    f"scheduler.{func.__name__}.seconds",
+                    time.perf_counter() - started,
+                )
+            # Renew once more so a slow run does not let the lease lapse
+            lease.acquire()
 
-        appointments = Appointment.query.filter(
-            (Appointment.status != "Completed") & (Appointment.status != "Missed")
-        ).all()
-        log_message("Checking appointments for emails...", Fore.RED)
+        wrapper.seconds = seconds
+        wrapper.lease = lease
+        return wrapper
 
-        for appointment in appointments:
-            user = User.query.get(appointment.user_id)
+    return decorator
+
+
+@scheduled_job(seconds=20)
+def check_medications():
+    # Current time with an offset for your timezone
+    now = local_now()
+
+    log_message("Checking medications for emails...", Fore.YELLOW)
+
+    # Only medications with a dose inside the reminder window are loaded,
+    # together with their users; `next_dose_at` is kept up to date whenever a
+    # medication is saved.
+    medications = (
+        Medication.query.options(joinedload(Medication.user))
+        .filter(
+            Medication.status.in_(ACTIVE_STATUSES),
+            Medication.next_dose_at <= now + DOSE_WINDOW,
+        )
+        .order_by(Medication.next_dose_at)
+        .all()
+    )
+
+    for medication in medications:
+        dose_at = medication.next_dose_at
+
+        if dose_at < now - DOSE_WINDOW:
+            # The window was missed (e.g. the scheduler was down), move on
             log_message(
-                f"Checking appointments for ... {user.email}     "
-                f"{appointment.start_time.strftime('%A, %B %d, %Y at %I:%M %p')}        "
-                f"{appointment.end_time.strftime('%A, %B %d, %Y at %I:%M %p')}  {now}",
-                Fore.BLUE,
+                f"Skipping missed dose of {medication.name} due at {dose_at}",
+                Fore.RED,
             )
+            medication.schedule_next_dose(after=now - DOSE_WINDOW)
+            db.session.commit()
+            continue
 
-            # If the appointment is about to start (within 30 minutes)
-            if now <= appointment.start_time <= now + timedelta(minutes=30):
-                if appointment.status == "Upcoming":
-                    formatted_start_time = appointment.start_time.strftime(
-                        "%A, %B %d, %Y at %I:%M %p"
-                    )
-                    email_body = (
-                        f"Dear {user.full_name},\n\n"
-                        f"This is a reminder for your upcoming appointment:\n\n"
-                        f"Description: {appointment.description or 'General Checkup'}\n"
-                        f"Date & Time: {formatted_start_time}\n"
-                        f"Doctor: {appointment.doctor.full_name if appointment.doctor else 'N/A'}\n\n"
-                    )
-
-                    send_email(
-                        to=user.email,
-                        name=user.full_name,
-                        subject="Upcoming Appointment Reminder",
-                        body=email_body,
-                        footer="Looking forward to seeing you soon!\nPlease arrive 10 minutes before your scheduled time. If you have any questions or need to reschedule, feel free to contact us.\n\nBest regards,\nThe HealthCare Team",
-                        current_year=datetime.now().year,
-                    )
-                    appointment.status = "30mins_Notified"
-
-            # If the appointment is ongoing and status is still 'Upcoming'
-            if (
-                appointment.start_time <= now <= appointment.end_time
-                and appointment.status == "30mins_Notified"
-            ):
-                formatted_start_time = appointment.start_time.strftime(
-                    "%A, %B %d, %Y at %I:%M %p"
-                )
-                email_body = (
-                    f"Dear {user.full_name},\n\n"
-                    f"This is a reminder that your appointment is currently ongoing:\n\n"
-                    f"Description: {appointment.description or 'General Checkup'}\n"
-                    f"Started at: {formatted_start_time}\n"
-                    f"Doctor: {appointment.doctor.full_name if appointment.doctor else 'N/A'}\n\n"
-                    "To join the meeting, please follow the link below:\n"
-                )
+        scheduled_time = dose_at.time()
+        user = medication.user
+        log_message(
+            f"Medication reminder for {user.email} - {medication.name} at {scheduled_time.strftime('%I:%M %p')} - current time: {now.time()}",
+            Fore.BLUE,
+        )
 
-                send_email(
-                    to=user.email,
-                    name=user.full_name,
-                    subject="Your Appointment is Ongoing",
-                    body=email_body,
-                    action_url=f"https://myhealthvault-backend.onrender.com/api/join_appointment/{appointment.id}",
-                    action_text="Join The Meeting",
-                    footer="We hope to see you soon!\nIf you have any questions or need assistance during your appointment, please feel free to contact us.\n\n"
-                    "Best regards,\nThe HealthCare Team",
-                    current_year=datetime.now().year,
-                )
-                appointment.status = "Notified"
-            # If the appointment is finished and the status is not 'Completed'
-            elif now > appointment.end_time and appointment.status == "Ongoing":
-                # Update appointment status to 'Completed'
-
-                # Format the end time
-                formatted_end_time = appointment.end_time.strftime(
-                    "%A, %B %d, %Y at %I:%M %p"
-                )
+        email_body = (
+            f"Hey {user.full_name},\n\n"
+            f"🎉 It's time to take your {medication.name}! 🎉\n\n"
+            f"🕒 Scheduled Time: {scheduled_time.strftime('%I:%M %p')}\n"
+            f"💊 Count Left: {medication.count_left}\n\n"
+            "Cheers to good health!\nThe HealthCare Team 😊"
+        )
 
-                # Compose the email body
-                email_body = (
-                    f"Dear {user.full_name},\n\n"
-                    f"We wanted to inform you that your appointment has ended:\n\n"
-                    f"Description: {appointment.description or 'General Checkup'}\n"
-                    f"Ended at: {formatted_end_time}\n"
-                    f"Doctor: {appointment.doctor.full_name if appointment.doctor else 'N/A'}\n\n"
-                    "Thank you for attending your appointment."
-                )
+        # Written in the same transaction as the dose bookkeeping below
+        EmailOutbox.enqueue(
+            to=user.email,
+            name=user.full_name,
+            subject=f"Time to Take Your Medication: {medication.name}",
+            body=email_body,
+            footer="Stay healthy and keep smiling!",
+            current_year=datetime.now().year,
+        )
 
-                # Send the completion notification email
-                send_email(
-                    to=user.email,
-                    name=user.full_name,
-                    subject="Appointment Completed",
-                    body=email_body,
-                    footer="We hope your appointment went well! If you have any questions or need additional help, feel free to contact us.\n\nBest regards,\nThe HealthCare Team",
-                    current_year=datetime.now().year,
-                )
-                appointment.status = "Completed"
+        # Update medication status and decrement count
+        medication.status = "ongoing"
+        medication.count_left -= 1
+        medication.last_sent_period = period_for(scheduled_time)
 
-            elif now > appointment.end_time and appointment.status == "Notified":
-                # Update appointment status to 'Missed'
+        if medication.count_left == 0:
+            congratulatory_email_body = (
+                f"Congratulations, {user.full_name}! 🎉\n\n"
+                f"You've completed your course of {medication.name}!\n\n"
+                "Cheers to your health and well-being!\nThe HealthCare Team 😊"
+            )
+            EmailOutbox.enqueue(
+                to=user.email,
+                name=user.full_name,
+                subject=f"Congrats on Completing Your Medication: {medication.name}!",
+                body=congratulatory_email_body,
+                footer="Keep up the great work!",
+                current_year=datetime.now().year,
+            )
+            medication.status = "completed"
 
-                # Format the end time
-                formatted_end_time = appointment.end_time.strftime(
-                    "%A, %B %d, %Y at %I:%M %p"
-                )
+        # Queue the following dose so this one is not sent twice
+        medication.schedule_next_dose(after=dose_at)
+        db.session.commit()
+
+
+def queue_reminder_email(appointment, user):
+    formatted_start_time = appointment.start_time.strftime("%A, %B %d, %Y at %I:%M %p")
+    email_body = (
+        f"Dear {user.full_name},\n\n"
+        f"This is a reminder for your upcoming appointment:\n\n"
+        f"Description: {appointment.description or 'General Checkup'}\n"
+        f"Date & Time: {formatted_start_time}\n"
+        f"Doctor: {appointment.doctor.full_name if appointment.doctor else 'N/A'}\n\n"
+    )
+
+    EmailOutbox.enqueue(
+        to=user.email,
+        name=user.full_name,
+        subject="Upcoming Appointment Reminder",
+        body=email_body,
+        footer="Looking forward to seeing you soon!\nPlease arrive 10 minutes before your scheduled time. If you have any questions or need to reschedule, feel free to contact us.\n\nBest regards,\nThe HealthCare Team",
+        current_year=datetime.now().year,
+    )
 
-                # Compose the email body
-                email_body = (
-                    f"Dear {user.full_name},\n\n"
-                    f"It appears that you missed your appointment:\n\n"
-                    f"Description: {appointment.description or 'General Checkup'}\n"
-                    f"Scheduled Time: {formatted_end_time}\n"
-                    f"Doctor: {appointment.doctor.full_name if appointment.doctor else 'N/A'}\n\n"
-                    "We understand that things come up, and we'd be happy to help you reschedule at your convenience.\n\n"
-                    "To reschedule your appointment, please follow the link below:\n"
-                )
 
-                # Send the missed appointment notification email
-                send_email(
-                    to=user.email,
-                    name=user.full_name,
-                    subject="Missed Appointment",
-                    action_url="https://incomparable-parfait-456242.netlify.app/",
-                    action_text="Reschedule Your Appointment",
-                    body=email_body,
-                    footer="We'd love to help you get back on track. Please use the link above to reschedule. If you need assistance, feel free to contact us.\n\nBest regards,\nThe HealthCare Team",
-                    current_year=datetime.now().year,
+def queue_ongoing_email(appointment, user):
+    formatted_start_time = appointment.start_time.strftime("%A, %B %d, %Y at %I:%M %p")
+    email_body = (
+        f"Dear {user.full_name},\n\n"
+        f"This is a reminder that your appointment is currently ongoing:\n\n"
+        f"Description: {appointment.description or 'General Checkup'}\n"
+        f"Started at: {formatted_start_time}\n"
+        f"Doctor: {appointment.doctor.full_name if appointment.doctor else 'N/A'}\n\n"
+        "To join the meeting, please follow the link below:\n"
+    )
+
+    EmailOutbox.enqueue(
+        to=user.email,
+        name=user.full_name,
+        subject="Your Appointment is Ongoing",
+        body=email_body,
+        action_url=f"https://myhealthvault-backend.onrender.com/api/join_appointment/{appointment.id}",
+        action_text="Join The Meeting",
+        footer="We hope to see you soon!\nIf you have any questions or need assistance during your appointment, please feel free to contact us.\n\n"
+        "Best regards,\nThe HealthCare Team",
+        current_year=datetime.now().year,
+    )
+
+
+def queue_completed_email(appointment, user):
+    formatted_end_time = appointment.end_time.strftime("%A, %B %d, %Y at %I:%M %p")
+    email_body = (
+        f"Dear {user.full_name},\n\n"
+        f"We wanted to inform you that your appointment has ended:\n\n"
+        f"Description: {appointment.description or 'General Checkup'}\n"
+        f"Ended at: {formatted_end_time}\n"
+        f"Doctor: {appointment.doctor.full_name if appointment.doctor else 'N/A'}\n\n"
+        "Thank you for attending your appointment."
+    )
+
+    EmailOutbox.enqueue(
+        to=user.email,
+        name=user.full_name,
+        subject="Appointment Completed",
+        body=email_body,
+        footer="We hope your appointment went well! If you have any questions or need additional help, feel free to contact us.\n\nBest regards,\nThe HealthCare Team",
+        current_year=datetime.now().year,
+    )
+
+
+def queue_missed_email(appointment, user):
+    formatted_end_time = appointment.end_time.strftime("%A, %B %d, %Y at %I:%M %p")
+    email_body = (
+        f"Dear {user.full_name},\n\n"
+        f"It appears that you missed your appointment:\n\n"
+        f"Description: {appointment.description or 'General Checkup'}\n"
+        f"Scheduled Time: {formatted_end_time}\n"
+        f"Doctor: {appointment.doctor.full_name if appointment.doctor else 'N/A'}\n\n"
+        "We understand that things come up, and we'd be happy to help you reschedule at your convenience.\n\n"
+        "To reschedule your appointment, please follow the link below:\n"
+    )
+
+    EmailOutbox.enqueue(
+        to=user.email,
+        name=user.full_name,
+        subject="Missed Appointment",
+        action_url="https://incomparable-parfait-456242.netlify.app/",
+        action_text="Reschedule Your Appointment",
+        body=email_body,
+        footer="We'd love to help you get back on track. Please use the link above to reschedule. If you need assistance, feel free to contact us.\n\nBest regards,\nThe HealthCare Team",
+        current_year=datetime.now().year,
+    )
+
+
+def transition_appointments(from_status, to_status, *window):
+    """
+    Move every appointment in `from_status` matching `window` to `to_status`
+    with a single UPDATE ... RETURNING and return the ids that changed. The
+    caller commits, together with the notifications for those ids.
+    """
+    statement = (
+        update(Appointment)
+        .where(Appointment.status == from_status, *window)
+        .values(status=to_status)
+        .returning(Appointment.id)
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(statement).scalars().all()
+
+
+# Function to update appointment statuses and send notifications
+@scheduled_job(seconds=60)
+def check_appointments():
+    now = local_now()
+    log_message("Checking appointments for emails...", Fore.RED)
+
+    # Each transition only touches the rows that can make it this tick,
+    # backed by the (status, start_time) and (status, end_time) indexes.
+    transitions = [
+        # Appointments about to start (within 30 minutes)
+        (
+            "Upcoming",
+            "30mins_Notified",
+            (
+                Appointment.start_time >= now,
+                Appointment.start_time <= now + timedelta(minutes=30),
+            ),
+            queue_reminder_email,
+        ),
+        # Reminded appointments that are now ongoing
+        (
+            "30mins_Notified",
+            "Notified",
+            (Appointment.start_time <= now, Appointment.end_time >= now),
+            queue_ongoing_email,
+        ),
+        # Finished appointments: joined ones are Completed, the rest Missed
+        ("Ongoing", "Completed", (Appointment.end_time < now,), queue_completed_email),
+        ("Notified", "Missed", (Appointment.end_time < now,), queue_missed_email),
+    ]
+
+    for from_status, to_status, window, notify in transitions:
+        appointment_ids = transition_appointments(from_status, to_status, *window)
+        if appointment_ids:
+            appointments = (
+                Appointment.query.options(
+                    joinedload(Appointment.user), joinedload(Appointment.doctor)
                 )
-                appointment.status = "Missed"
+                .filter(Appointment.id.in_(appointment_ids))
+                .all()
+            )
+            for appointment in appointments:
+                user = appointment.user
+                # The bulk UPDATE bypasses the ORM events that do this
+                mark_dashboard_stale(db.session, appointment.user_id)
+                log_appointment(appointment, user, now)
+                notify(appointment, user)
+        # The status change and its emails land in one transaction
+        db.session.commit()
 
-            db.session.commit()
+
+@scheduled_job(seconds=60)
+def publish_user_count():
+    """Count the users once a minute so dashboards do not count per request."""
+    refresh_user_count()
+
+
+def claim_email_outbox(now):
+    """
+    Claim a batch of due outbox emails for this process and return their ids.
+
+    The rows are marked ``sending`` and hidden from other drains until
+    EMAIL_OUTBOX_CLAIM_SECONDS from now, in one committed UPDATE ... RETURNING,
+    so no other process picks them up while they are being sent. Rows whose
+    claim ran out, because their sender died, are due again.
+    """
+    due = (
+        select(EmailOutbox.id)
+        .where(
+            EmailOutbox.status.in_(("pending", "sending")),
+            EmailOutbox.next_attempt_at <= now,
+        )
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(app.config["EMAIL_OUTBOX_BATCH_SIZE"])
+        .with_for_update(skip_locked=True)
+    )
+    claimed_until = now + timedelta(seconds=app.config["EMAIL_OUTBOX_CLAIM_SECONDS"])
+    statement = (
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(due.scalar_subquery()))
+        .values(status="sending", next_attempt_at=claimed_until)
+        .returning(EmailOutbox.id)
+        .execution_options(synchronize_session=False)
+    )
+    email_ids = db.session.execute(statement).scalars().all()
+    db.session.commit()
+    return email_ids
+
+
+@scheduled_job(seconds=10)
+def drain_email_outbox():
+    """
+    Send a batch of pending outbox emails. Failed sends are retried with
+    exponential backoff and marked dead after EMAIL_OUTBOX_MAX_ATTEMPTS.
+    """
+    email_ids = claim_email_outbox(datetime.utcnow())
+    if not email_ids:
+        return
+    emails = (
+        EmailOutbox.query.filter(EmailOutbox.id.in_(email_ids))
+        .order_by(EmailOutbox.created_at)
+        .all()
+    )
+
+    for email in emails:
+        try:
+            send_email(**email.send_kwargs())
+        except Exception as e:
+            email.attempts += 1
+            email.last_error = str(e)
+            if email.attempts >= app.config["EMAIL_OUTBOX_MAX_ATTEMPTS"]:
+                email.status = "dead"
+                metrics.incr("email_outbox.dead")
+                log_message(
+                    f"Giving up on email to {email.recipient} after {email.attempts} attempts: {e}",
+                    Fore.RED,
+                )
+            else:
+                backoff = app.config["EMAIL_OUTBOX_BACKOFF_SECONDS"] * 2 ** (
+                    email.attempts - 1
+                )
+                email.status = "pending"
+                email.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+                metrics.incr("email_outbox.retried")
+        else:
+            email.status = "sent"
+            email.sent_at = datetime.utcnow()
+            metrics.incr("email_outbox.sent")
+        # Record each outcome right away so a crash repeats at most one email
+        db.session.commit()
+
+
+def log_appointment(appointment, user, now):
+    log_message(
+        f"Checking appointments for ... {user.email}     "
+        f"{appointment.start_time.strftime('%A, %B %d, %Y at %I:%M %p')}        "
+        f"{appointment.end_time.strftime('%A, %B %d, %Y at %I:%M %p')}  {now}",
+        Fore.BLUE,
+    )
 
 
 # Scheduler to check appointments every minute
 
 swagger = Swagger(app, template_file="swagger_doc.yaml")
 
-# Scheduler to check appointments and medications
-scheduler.add_job(func=check_appointments, trigger="interval", seconds=60)
-scheduler.add_job(func=check_medications, trigger="interval", seconds=20)
+SCHEDULED_JOBS = (
+    check_appointments,
+    check_medications,
+    publish_user_count,
+    drain_email_outbox,
+)
+
+
+def register_jobs(target):
+    """Add the appointment, medication and email outbox jobs to `target`."""
+    for job in SCHEDULED_JOBS:
+        target.add_job(func=job, trigger="interval", seconds=job.seconds)
+
+
+# Scheduler to check appointments and medications. Deployments that run
+# `flask worker` / `python -m api.worker` set SCHEDULER_ENABLED=false so the
+# web workers only serve requests. Under `python -m api.app` the password
+# hashing pool's children re-import this module as __mp_main__; they must not
+# schedule anything either.
+if app.config["SCHEDULER_ENABLED"] and __name__ != "__mp_main__":
+    register_jobs(scheduler)
+    scheduler.start()
+
+
+@app.cli.command("worker")
+def worker_command():
+    """Run the scheduled jobs in the foreground, without serving requests."""
+    from .worker import run_worker
+
+    run_worker()
+
+
+app.cli.add_command(bench)
+app.cli.add_command(search_cli)
+
+atexit.register(email_dispatcher.shutdown)
+atexit.register(smtp_pool.close_all)
+atexit.register(token_blocklist.close)
+atexit.register(password_hasher.shutdown)
+
+
+@atexit.register
+def release_scheduler_leases():
+    """Hand the job leases over right away instead of waiting for them to expire."""
+    for job in SCHEDULED_JOBS:
+        try:
+            job.lease.release()
+        except redis.RedisError:
+            pass
+
 
 # Scheduler setup
 
@@ -0,0 +1,321 @@
+"""
+Micro-benchmarks for hot paths, run with ``flask bench <name>``.
+
+They use made-up data and never touch the configured database or the
+network; benchmarks that need rows load them into a throwaway in-memory
+SQLite database.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+
+import click
+from flask import render_template
+from flask.cli import AppGroup
+
+bench = AppGroup("bench", help="Run a micro-benchmark.")
+
+
+def rate(func, seconds):
+    """Call `func` repeatedly for about `seconds` and return calls per second."""
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        func(calls)
+        calls += 1
+    return calls / (time.perf_counter() - started)
+
+
+# Distinct medications across the reminders, more than any cache slot count
+MEDICATIONS = 1000
+
+
+def reminder_email(index):
+    """The context of a medication reminder for the `index`-th recipient."""
+    name = f"Patient {index}"
+    medication = f"Medication {index % MEDICATIONS}"
+    return {
+        "name": name,
+        "subject": f"Time to Take Your Medication: {medication}",
+        "body": (
+            f"Dear {name},\n\nThis is a friendly reminder to take your "
+            f"medication: {medication}.\nIt's time for your morning dose "
+            "at 08:00.\n\n"
+        ),
+        "footer": "Stay healthy and keep smiling!",
+        "current_year": datetime.now().year,
+    }
+
+
+def appointment_email(index):
+    """The context of an ongoing appointment email for the `index`-th recipient."""
+    name = f"Patient {index}"
+    return {
+        "name": name,
+        "subject": "Your Appointment is Ongoing",
+        "body": (
+            f"Dear {name},\n\nThis is a reminder that your appointment is "
+            "currently ongoing:\n\nDescription: General Checkup\n"
+            "Started at: Monday, January 06, 2025 at 10:00 AM\n"
+            "Doctor: Dr. Ada Obi\n\nTo join the meeting, please follow the "
+            "link below:\n"
+        ),
+        "action_url": f"https://myhealthvault-backend.onrender.com/api/join_appointment/{index}",
+        "action_text": "Join The Meeting",
+        "footer": "We hope to see you soon!\n\nBest regards,\nThe HealthCare Team",
+        "current_year": datetime.now().year,
+    }
+
+
+EMAIL_TYPES = {"reminder": reminder_email, "appointment": appointment_email}
+
+
+def bench_email_rendering(seconds=2.0, template_name="email_template.html"):
+    """
+    Return renders per second of `render_template` and of the cached
+    fragments, and the fragment cache hit rate, per email type.
+    """
+    from api.notifications import email_templates
+
+    results = {}
+    for email_type, make_context in EMAIL_TYPES.items():
+        results[email_type] = {
+            "render_template": rate(
+                lambda i: render_template(template_name, **make_context(i)), seconds
+            ),
+        }
+        before = email_templates.cache_info()
+        results[email_type]["fragments"] = rate(
+            lambda i: email_templates.render(template_name, **make_context(i)),
+            seconds,
+        )
+        after = email_templates.cache_info()
+        hits, misses = after.hits - before.hits, after.misses - before.misses
+        results[email_type]["hit_rate"] = hits / max(1, hits + misses)
+    return results
+
+
+@bench.command("email")
+@click.option("--seconds", default=2.0, help="How long to run each case.")
+def email_command(seconds):
+    """Renders per second for the reminder and appointment emails."""
+    results = bench_email_rendering(seconds)
+    for email_type, rates in results.items():
+        hit_rate = rates.pop("hit_rate")
+        for renderer, per_second in rates.items():
+            click.echo(f"{email_type:<12} {renderer:<16} {per_second:>10.0f} renders/s")
+        click.echo(f"{email_type:<12} {'cache hit rate':<16} {hit_rate:>10.1%}")
+
+
+def bench_serialization(rows=10000, repeat=3):
+    """
+    Return the best seconds, out of `repeat` runs, to load and serialize
+    `rows` users through ORM instances and `to_dict`, and through a column
+    select and the precompiled row serializer.
+    """
+    from sqlalchemy import create_engine, insert, select
+    from sqlalchemy.orm import Session
+
+    from api import db
+    from api.serializers import serializer_for
+    from models.user import User
+
+    engine = create_engine("sqlite://")
+    db.metadata.create_all(engine, tables=[User.__table__])
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(
+            insert(User),
+            [
+                {
+                    "id": f"user-{index:06d}",
+                    "full_name": f"Patient {index}",
+                    "email": f"patient{index}@example.com",
+                    "password": "x",
+                    "gender": "Other",
+                    "bio": "",
+                    "last_login": now,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for index in range(rows)
+            ],
+        )
+
+    serializer = serializer_for(User)
+    columns = select(*serializer.columns)
+
+    def orm():
+        with Session(engine) as session:
+            return [user.to_dict() for user in session.scalars(select(User))]
+
+    def rows_path():
+        with engine.connect() as connection:
+            return [serializer(row) for row in connection.execute(columns)]
+
+    results = {}
+    for label, func in (("to_dict", orm), ("row serializer", rows_path)):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = func()
+            timings.append(time.perf_counter() - started)
+        results[label] = (min(timings), output)
+    engine.dispose()
+    if results["to_dict"][1] != results["row serializer"][1]:
+        raise RuntimeError("The row serializer does not match to_dict")
+    return {label: seconds for label, (seconds, _) in results.items()}
+
+
+@bench.command("serialize")
+@click.option("--rows", default=10000, help="How many users to serialize.")
+def serialize_command(rows):
+    """Compare to_dict with the column serializers on a users listing."""
+    for label, seconds in bench_serialization(rows).items():
+        click.echo(
+            f"{label:<16} {seconds * 1000:>8.1f} ms  {rows / seconds:>10.0f} rows/s"
+        )
+
+
+def user_records_payload(records=50):
+    """A /user_records response body holding `records` made-up records."""
+    from api.serializers import FIELDS
+    from models.medical_records import MedicalRecords
+
+    now = datetime.utcnow().isoformat()
+    data = []
+    for index in range(records):
+        record = dict.fromkeys(FIELDS[MedicalRecords])
+        record.update(
+            id=f"{index:08d}-8c1f-4e4b-9a53-0d7d2b6c{index:04d}",
+            user_id="5b0f1a34-2f55-4c1e-8d8c-1b8f6a7c9e01",
+            record_name=f"Blood panel {index}",
+            health_care_provider="Lagos University Teaching Hospital",
+            type_of_record="Lab result",
+            diagnosis="Mild iron deficiency anaemia",
+            notes=(
+                "Haemoglobin slightly below range. Start ferrous sulphate "
+                f"200mg daily and repeat the panel in {index % 12 + 1} weeks."
+            ),
+            status="final",
+            practitioner_name="Dr. Ada Obi",
+            last_added=now,
+            last_updated=now,
+            created_at=now,
+            updated_at=now,
+        )
+        data.append(record)
+    body = {
+        "msg": "Medical Records successfully retrieved",
+        "status": True,
+        "statusCode": 200,
+        "data": data,
+        "next_cursor": None,
+    }
+    return json.dumps(body, separators=(",", ":")).encode()
+
+
+def bench_compression(records=50, seconds=1.0):
+    """
+    Return, per encoding and level, the compressed size of a /user_records
+    payload and the CPU milliseconds it costs to compress it.
+    """
+    import gzip
+
+    from api.compression import brotli
+
+    data = user_records_payload(records)
+    cases = [("gzip", level, gzip.compress) for level in (1, 6, 9)]
+    if brotli is not None:
+        cases += [("br", quality, brotli.compress) for quality in (1, 4, 11)]
+
+    results = []
+    for encoding, level, func in cases:
+        if encoding == "gzip":
+            compress = lambda i: func(data, compresslevel=level, mtime=0)
+        else:
+            compress = lambda i: func(data, quality=level)
+        per_second = rate(compress, seconds)
+        results.append(
+            {
+                "encoding": encoding,
+                "level": level,
+                "bytes": len(compress(0)),
+                "original": len(data),
+                "ms": 1000 / per_second,
+            }
+        )
+    return results
+
+
+@bench.command("compress")
+@click.option("--records", default=50, help="Records in the /user_records payload.")
+@click.option("--seconds", default=1.0, help="How long to run each case.")
+def compress_command(records, seconds):
+    """CPU cost against bytes saved when compressing /user_records."""
+    for case in bench_compression(records, seconds):
+        saved = 1 - case["bytes"] / case["original"]
+        click.echo(
+            f"{case['encoding']:<5} level {case['level']:<3}"
+            f" {case['original']:>8} -> {case['bytes']:>7} bytes"
+            f" ({saved:>5.1%} saved)  {case['ms']:>7.3f} ms"
+        )
+
+
+def bench_logins(seconds=3.0, rounds=12, workers=2):
+    """
+    Return password checks per second, and per core, at cost `rounds`
+    through a pool of `workers` processes (inline when 0).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from flask import Flask
+
+    from api.passwords import PasswordHasher
+
+    app = Flask(__name__)
+    app.config.update(BCRYPT_LOG_ROUNDS=rounds, PASSWORD_HASH_WORKERS=workers)
+    hasher = PasswordHasher(app)
+    hashed = hasher.hash("correct horse battery staple")
+    # Warm the pool up so process start-up is not measured
+    hasher.check("correct horse battery staple", hashed)
+
+    def login(deadline):
+        logins = 0
+        while time.perf_counter() < deadline:
+            hasher.check("correct horse battery staple", hashed)
+            logins += 1
+        return logins
+
+    # Twice as many request threads as processes keeps every process busy
+    callers = max(1, workers * 2)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(callers) as threads:
+        counts = list(threads.map(login, [started + seconds] * callers))
+    per_second = sum(counts) / (time.perf_counter() - started)
+    hasher.shutdown()
+    cores = min(max(1, workers), os.cpu_count() or 1)
+    return {"logins": per_second, "per_core": per_second / cores}
+
+
+@bench.command("login")
+@click.option("--seconds", default=3.0, help="How long to run each case.")
+@click.option("--rounds", default=None, type=int, help="bcrypt cost.")
+@click.option("--workers", default=None, type=int, help="Hashing processes.")
+def login_command(seconds, rounds, workers):
+    """Password checks (logins) per second and per core."""
+    from flask import current_app
+
+    rounds = rounds or current_app.config["BCRYPT_LOG_ROUNDS"]
+    if workers is None:
+        workers = current_app.config["PASSWORD_HASH_WORKERS"]
+    for pool in sorted({0, workers}):
+        result = bench_logins(seconds, rounds, pool)
+        label = f"{pool} processes" if pool else "inline"
+        click.echo(
+            f"cost {rounds:<3} {label:<12} {result['logins']:8.1f} logins/s"
+            f"  {result['per_core']:8.1f} logins/s/core"
+        )
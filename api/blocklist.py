@@ -0,0 +1,183 @@
+"""
+The JWT blocklist, with a process-local cache of tokens known to be good.
+
+Revoked jtis live in Redis until their token would have expired anyway.
+Checking every request against Redis costs a round trip, so each process
+remembers the jtis it recently found missing from the blocklist, for at most
+JWT_BLOCKLIST_CACHE_TTL seconds, in an LRU of JWT_BLOCKLIST_CACHE_SIZE.
+
+Revocations are published on JWT_BLOCKLIST_CHANNEL as well. Every process
+listens there and drops a revoked jti from its cache as soon as the message
+arrives. Pub/sub delivery is not guaranteed, so the cache is only consulted
+while the subscription is up and is cleared whenever it (re)connects; the
+TTL bounds the damage of a message lost in between.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from colorama import Fore
+
+from api import jwt_redis_blocklist, metrics
+
+
+class TokenBlocklist:
+    def __init__(self, client, app=None):
+        self.client = client
+        self.app = None
+        self._cache = OrderedDict()
+        # Bumped on every revocation, see _remember
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["token_blocklist"] = self
+
+    @property
+    def channel(self):
+        return self.app.config["JWT_BLOCKLIST_CHANNEL"]
+
+    def revoke(self, jti, expires_in):
+        """Block `jti` for `expires_in` seconds, in every process."""
+        message = json.dumps({"jti": jti, "at": time.time()})
+        pipe = self.client.pipeline()
+        pipe.setex(jti, expires_in, "true")
+        pipe.publish(self.channel, message)
+        pipe.execute()
+        self._forget(jti)
+
+    def is_revoked(self, jti):
+        ttl = self.app.config["JWT_BLOCKLIST_CACHE_TTL"]
+        if ttl > 0:
+            self._start()
+        if ttl > 0 and self._connected.is_set():
+            with self._lock:
+                checked_at = self._cache.get(jti)
+                if checked_at is not None:
+                    age = time.monotonic() - checked_at
+                    if age < ttl:
+                        self._cache.move_to_end(jti)
+                        metrics.incr("jwt_blocklist.local_hits")
+                        # How old the answer we trusted was
+                        metrics.observe("jwt_blocklist.hit_age", age)
+                        return False
+                    del self._cache[jti]
+
+        metrics.incr("jwt_blocklist.redis_lookups")
+        checked_at = time.monotonic()
+        generation = self._generation
+        if self.client.get(jti) is not None:
+            return True
+        if ttl > 0 and self._connected.is_set():
+            self._remember(jti, checked_at, generation)
+        return False
+
+    def close(self):
+        """Stop listening for revocations and forget every cached jti."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(5)
+        self._thread = None
+        self._pid = None
+        self._connected.clear()
+        self._clear()
+
+    def _remember(self, jti, checked_at, generation):
+        with self._lock:
+            if generation != self._generation:
+                # A revocation arrived during the lookup and may be this jti
+                return
+            self._cache[jti] = checked_at
+            self._cache.move_to_end(jti)
+            while len(self._cache) > self.app.config["JWT_BLOCKLIST_CACHE_SIZE"]:
+                self._cache.popitem(last=False)
+            metrics.set_gauge("jwt_blocklist.cache_size", len(self._cache))
+
+    def _forget(self, jti):
+        with self._lock:
+            self._generation += 1
+            self._cache.pop(jti, None)
+
+    def _clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+            metrics.set_gauge("jwt_blocklist.cache_size", 0)
+
+    def _start(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._connected.clear()
+            self._thread = threading.Thread(
+                target=self._listen, name="jwt-blocklist", daemon=True
+            )
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _listen(self):
+        from api.app import log_message
+
+        stop = self._stop
+        while not stop.is_set():
+            pubsub = self.client.pubsub()
+            try:
+                pubsub.subscribe(self.channel)
+                while not stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message["type"] == "subscribe":
+                        # Revocations sent while we were not listening are
+                        # lost, so nothing cached before now can be trusted
+                        self._clear()
+                        self._connected.set()
+                        metrics.set_gauge("jwt_blocklist.listening", 1)
+                    elif message["type"] == "message":
+                        self._received(message["data"])
+            except redis.RedisError as e:
+                log_message(f"JWT blocklist channel lost: {e}", Fore.RED)
+                metrics.incr("jwt_blocklist.channel_errors")
+                stop.wait(1)
+            finally:
+                self._connected.clear()
+                metrics.set_gauge("jwt_blocklist.listening", 0)
+                try:
+                    pubsub.close()
+                except redis.RedisError:
+                    pass
+
+    def _received(self, data):
+        try:
+            revocation = json.loads(data)
+            jti = revocation["jti"]
+            revoked_at = revocation.get("at")
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return
+        if not isinstance(jti, str):
+            return
+        self._forget(jti)
+        metrics.incr("jwt_blocklist.revocations_received")
+        if isinstance(revoked_at, (int, float)):
+            # Seconds from the revoking process to this one
+            metrics.observe(
+                "jwt_blocklist.propagation", max(0.0, time.time() - revoked_at)
+            )
+
+
+token_blocklist = TokenBlocklist(jwt_redis_blocklist)
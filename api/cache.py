@@ -0,0 +1,174 @@
+"""
+Redis read-through caches.
+
+Entries are JSON documents grouped in Redis hashes: one hash per cached
+object (or per family of listings), one field per variant of it, such as
+the ``fields=`` subset a client asked for. Invalidating an object deletes
+its hash, and with it every variant, in one round trip. Hashes also expire
+after a TTL, counted from their first entry, as a safety net for writes
+that bypass invalidation.
+
+If Redis is unreachable the caller's loader runs as if the cache were
+empty, so the endpoints behind a cache keep working without it.
+
+Dashboards are dropped by ORM events on the models they count, once the
+writing transaction commits. The global user count is published by a
+scheduler job rather than cached on read.
+"""
+
+import json
+
+import redis
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import object_session
+
+from api import db, metrics, redis_client
+from models.appointment import Appointment
+from models.medical_records import MedicalRecords
+from models.medication import Medication
+from models.user import User
+
+
+class ReadThroughCache:
+    def __init__(self, client, name, ttl_setting):
+        self.client = client
+        self.name = name
+        self.ttl_setting = ttl_setting
+
+    def key(self, *parts):
+        return ":".join(("cache", self.name) + tuple(str(part) for part in parts))
+
+    def get(self, key, variant, load):
+        """
+        Return the `variant` entry of `key`, calling `load` to build it on a
+        miss. Entries for which `load` returns None are not stored.
+        """
+        try:
+            cached = self.client.hget(key, variant)
+        except redis.RedisError:
+            metrics.incr(f"cache.{self.name}.errors")
+            return load()
+        if cached is not None:
+            metrics.incr(f"cache.{self.name}.hits")
+            return json.loads(cached)
+
+        metrics.incr(f"cache.{self.name}.misses")
+        value = load()
+        if value is not None:
+            self.store(key, variant, value)
+        return value
+
+    def store(self, key, variant, value):
+        ttl = current_app.config[self.ttl_setting]
+        try:
+            pipe = self.client.pipeline()
+            pipe.hset(key, variant, current_app.json.dumps(value))
+            pipe.ttl(key)
+            _, remaining = pipe.execute()
+            # Later variants must not push the expiry back. EXPIRE NX would
+            # do this in one step but needs Redis 7.
+            if remaining < 0:
+                self.client.expire(key, ttl)
+        except redis.RedisError:
+            metrics.incr(f"cache.{self.name}.errors")
+
+    def invalidate(self, *keys):
+        try:
+            self.client.delete(*keys)
+            metrics.incr(f"cache.{self.name}.invalidations")
+        except redis.RedisError:
+            # The TTL still bounds how long the stale entries are served
+            metrics.incr(f"cache.{self.name}.errors")
+            current_app.logger.warning("Could not invalidate %s", ", ".join(keys))
+
+
+doctor_cache = ReadThroughCache(redis_client, "doctor", "DOCTOR_CACHE_TTL")
+
+
+def doctor_key(doctor_id):
+    return doctor_cache.key("id", doctor_id)
+
+
+def doctor_email_key(email):
+    return doctor_cache.key("email", email)
+
+
+# Every listing and search result shares one hash; any doctor write drops it
+DOCTOR_LISTS_KEY = doctor_cache.key("lists")
+
+
+def forget_doctor(doctor=None):
+    """Drop the cached profile of `doctor` and every cached doctor listing."""
+    keys = [DOCTOR_LISTS_KEY]
+    if doctor is not None:
+        keys.append(doctor_key(doctor.id))
+        if doctor.email:
+            keys.append(doctor_email_key(doctor.email))
+    doctor_cache.invalidate(*keys)
+
+
+# Per-user dashboard: counts and the first upcoming appointments
+dashboard_cache = ReadThroughCache(redis_client, "dashboard", "DASHBOARD_CACHE_TTL")
+
+
+def dashboard_key(user_id):
+    return dashboard_cache.key("user", user_id)
+
+
+def mark_dashboard_stale(session, user_id):
+    """Drop the dashboard of `user_id` once `session` commits."""
+    if user_id is not None:
+        session.info.setdefault("stale_dashboards", set()).add(user_id)
+
+
+def _mark_target_stale(mapper, connection, target):
+    mark_dashboard_stale(object_session(target), target.user_id)
+
+
+for _model in (Appointment, MedicalRecords, Medication):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        db.event.listen(_model, _event, _mark_target_stale)
+
+
+@db.event.listens_for(db.session, "after_commit")
+def _forget_stale_dashboards(session):
+    user_ids = session.info.pop("stale_dashboards", None)
+    if user_ids:
+        dashboard_cache.invalidate(*[dashboard_key(user_id) for user_id in user_ids])
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def _keep_dashboards(session):
+    session.info.pop("stale_dashboards", None)
+
+
+# Every dashboard shows the total user count, refreshed by a scheduler job
+USER_COUNT_KEY = "stats:total_users"
+
+
+def refresh_user_count():
+    """Count the users and publish the total for `total_users`."""
+    total = db.session.query(func.count(User.id)).scalar()
+    ttl = current_app.config["USER_COUNT_TTL"]
+    try:
+        redis_client.setex(USER_COUNT_KEY, ttl, total)
+    except redis.RedisError:
+        metrics.incr("cache.user_count.errors")
+    return total
+
+
+def total_users():
+    """
+    The user count as last published. Counted on the spot only when it has
+    not been published yet or the refresh job stopped running.
+    """
+    try:
+        total = redis_client.get(USER_COUNT_KEY)
+    except redis.RedisError:
+        metrics.incr("cache.user_count.errors")
+        total = None
+    if total is not None:
+        return int(total)
+    metrics.incr("cache.user_count.misses")
+    return refresh_user_count()
@@ -0,0 +1,85 @@
+"""
+Opt-in compression of JSON and HTML responses.
+
+Enabled with COMPRESS_ENABLED. Responses of at least COMPRESS_MIN_SIZE bytes
+are compressed with brotli when the client accepts it and the ``brotli``
+package is installed, otherwise with gzip. Smaller bodies are sent as is:
+below a kilobyte or so the CPU spent buys next to nothing.
+"""
+
+import gzip
+
+from flask import request
+
+from api import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+class Compress:
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["compress"] = self
+        app.after_request(self.after_request)
+
+    def encodings(self):
+        """The encodings this process can produce, best first."""
+        return ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def choose_encoding(self, accept_encodings):
+        """Pick the encoding the client ranks highest, or None."""
+        best = None
+        best_quality = 0
+        for encoding in self.encodings():
+            quality = accept_encodings[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compress(self, data, encoding):
+        config = self.app.config
+        if encoding == "br":
+            return brotli.compress(data, quality=config["COMPRESS_BR_LEVEL"])
+        return gzip.compress(data, compresslevel=config["COMPRESS_LEVEL"], mtime=0)
+
+    def after_request(self, response):
+        config = self.app.config
+        if not config["COMPRESS_ENABLED"]:
+            return response
+
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or not 200 <= response.status_code < 300
+            or response.status_code == 204
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in config["COMPRESS_MIMETYPES"]
+        ):
+            return response
+        # The body depends on Accept-Encoding from here on, even if it's small
+        response.vary.add("Accept-Encoding")
+
+        data = response.get_data()
+        if len(data) < config["COMPRESS_MIN_SIZE"]:
+            return response
+        encoding = self.choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        compressed = self.compress(data, encoding)
+        metrics.incr(f"compress.{encoding}.responses")
+        metrics.incr("compress.bytes_saved", len(data) - len(compressed))
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+compress = Compress()
@@ -0,0 +1,143 @@
+"""
+Conditional GETs for the read endpoints.
+
+A resource's version is the row count plus the newest ``updated_at`` of the
+rows behind it, read with one aggregate statement. The ETag hashes that
+version together with the request itself (path, query string, body and the
+caller's identity). A matching If-None-Match header gets a 304 before the
+rows are loaded or serialized.
+
+Last-Modified is sent for information only: deleting a row other than the
+newest does not move it, so only If-None-Match can produce a 304.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+
+from flask import Response, after_this_request, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import func, select, true
+
+from api import db
+
+
+class Version:
+    """
+    The validators of one response. `state` is a string that changes
+    whenever the rows behind the response do.
+    """
+
+    def __init__(self, state, last_modified):
+        digest = hashlib.sha1()
+        self.state = state
+        for part in (
+            state,
+            str(get_jwt_identity()),
+            request.full_path,
+            request.get_data(as_text=True),
+        ):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        self.etag = digest.hexdigest()
+        self.last_modified = last_modified
+
+    def dump(self):
+        """A JSON-able form of the version, for `restore` in a later request."""
+        last_modified = self.last_modified
+        return [self.state, last_modified.isoformat() if last_modified else None]
+
+    @classmethod
+    def restore(cls, dumped):
+        state, last_modified = dumped
+        if last_modified is not None:
+            last_modified = datetime.fromisoformat(last_modified)
+        return cls(state, last_modified)
+
+    def fresh(self):
+        """True when the client already holds this version."""
+        if request.method not in ("GET", "HEAD"):
+            return False
+        return request.if_none_match.contains_weak(self.etag)
+
+    def not_modified(self):
+        response = Response(status=304)
+        self.set_headers(response)
+        return response
+
+    def attach(self, response):
+        """Add the validators to a successful response."""
+        if response.status_code == 200:
+            self.set_headers(response)
+        return response
+
+    def set_headers(self, response):
+        response.set_etag(self.etag, weak=True)
+        if self.last_modified is not None:
+            response.last_modified = self.last_modified.replace(tzinfo=timezone.utc)
+        # Let the client keep the body but always ask before using it
+        response.headers["Cache-Control"] = "private, no-cache"
+
+
+def aggregate(*parts):
+    """
+    Return one row holding, for each of `parts` (a query followed by
+    timestamp columns), the query's row count and the maximum of each column.
+
+    Every part is reduced to one row of ``count(*), max(...)`` and the parts
+    are cross joined, so the whole row costs a single statement.
+    """
+    aggregates = []
+    for query, *timestamps in parts:
+        aggregates.append(
+            query.order_by(None)
+            .with_entities(
+                func.count().label("count"),
+                *[
+                    func.max(column).label(f"max_{i}")
+                    for i, column in enumerate(timestamps)
+                ],
+            )
+            .subquery()
+        )
+    # Each aggregate is exactly one row, so joining them on TRUE is one row too
+    joined = aggregates[0]
+    for aggregate in aggregates[1:]:
+        joined = joined.join(aggregate, true())
+    columns = [column for aggregate in aggregates for column in aggregate.c]
+    return tuple(db.session.execute(select(*columns).select_from(joined)).one())
+
+
+def version_for(values):
+    """
+    The Version of a response built from `values`. Last-Modified is the
+    newest timestamp among them.
+    """
+    timestamps = [
+        value for value in values if value is not None and hasattr(value, "isoformat")
+    ]
+    return Version(repr(tuple(values)), max(timestamps, default=None))
+
+
+def version_of(*parts):
+    """
+    Return the Version of the rows selected by `parts`, each a tuple of a
+    query and the timestamp columns whose maximum tracks changes to it.
+    """
+    return version_for(aggregate(*parts))
+
+
+def not_modified(*parts):
+    """
+    Return a 304 response when the client already holds the version of
+    `parts` (see `version_of`). Otherwise return None and have the
+    validators added to the view's response.
+    """
+    return not_modified_since(version_of(*parts))
+
+
+def not_modified_since(version):
+    """`not_modified` for a version the caller already has, e.g. cached."""
+    if version.fresh():
+        return version.not_modified()
+    after_this_request(version.attach)
+    return None
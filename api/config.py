@@ -13,6 +13,19 @@ class Config:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = os.environ.get("SQLALCHEMY_DATABASE_URI")
+    # Engine pool, see api/engine.py; SQLALCHEMY_ENGINE_OPTIONS overrides these
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 5))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+    # Postgres statement timeouts in milliseconds, 0 for none
+    DB_STATEMENT_TIMEOUT_WEB_MS = int(
+        os.environ.get("DB_STATEMENT_TIMEOUT_WEB_MS", 15000)
+    )
+    DB_STATEMENT_TIMEOUT_WORKER_MS = int(
+        os.environ.get("DB_STATEMENT_TIMEOUT_WORKER_MS", 300000)
+    )
 
     REDIS_URL = os.environ.get("REDIS_URL")
 
@@ -23,9 +36,70 @@ class Config:
     MAIL_USERNAME = os.environ.get("MAIL_USERNAME")
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
     MAIL_DEFAULT_SENDER = os.environ.get("DEFAULT_FROM_EMAIL")
+    MAIL_POOL_SIZE = int(os.environ.get("MAIL_POOL_SIZE", 4))
+    MAIL_MAX_EMAILS_PER_CONNECTION = int(
+        os.environ.get("MAIL_MAX_EMAILS_PER_CONNECTION", 100)
+    )
+    MAIL_POOL_IDLE_SECONDS = int(os.environ.get("MAIL_POOL_IDLE_SECONDS", 60))
+
+    # Verification and password emails are sent from a background pool
+    EMAIL_DISPATCH_ASYNC = (
+        os.environ.get("EMAIL_DISPATCH_ASYNC", "true").lower() == "true"
+    )
+    EMAIL_DISPATCH_WORKERS = int(os.environ.get("EMAIL_DISPATCH_WORKERS", 4))
+    EMAIL_QUEUE_SIZE = int(os.environ.get("EMAIL_QUEUE_SIZE", 1000))
+
+    # Cursor pagination of the list endpoints
+    PAGE_SIZE = int(os.environ.get("PAGE_SIZE", 50))
+    PAGE_SIZE_MAX = int(os.environ.get("PAGE_SIZE_MAX", 200))
+    # Rows fetched per round trip by ?stream=true listings
+    STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", 500))
+
+    # Compression of JSON and HTML responses, off unless enabled
+    COMPRESS_ENABLED = os.environ.get("COMPRESS_ENABLED", "false").lower() == "true"
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", 6))
+    COMPRESS_BR_LEVEL = int(os.environ.get("COMPRESS_BR_LEVEL", 4))
+    COMPRESS_MIMETYPES = ("application/json", "text/html")
+
+    # Seconds a cached doctor profile or listing may outlive a missed invalidation
+    DOCTOR_CACHE_TTL = int(os.environ.get("DOCTOR_CACHE_TTL", 300))
+    # Upcoming appointments on the dashboard, cached per user for a short while
+    DASHBOARD_UPCOMING_LIMIT = int(os.environ.get("DASHBOARD_UPCOMING_LIMIT", 10))
+    DASHBOARD_CACHE_TTL = int(os.environ.get("DASHBOARD_CACHE_TTL", 60))
+    # Lifetime of the published user count, a few runs of its refresh job
+    USER_COUNT_TTL = int(os.environ.get("USER_COUNT_TTL", 300))
+
+    # Process-local cache of jtis found missing from the Redis blocklist;
+    # revocations reach every process on the channel, 0 turns the cache off
+    JWT_BLOCKLIST_CACHE_TTL = float(os.environ.get("JWT_BLOCKLIST_CACHE_TTL", 30))
+    JWT_BLOCKLIST_CACHE_SIZE = int(os.environ.get("JWT_BLOCKLIST_CACHE_SIZE", 10000))
+    JWT_BLOCKLIST_CHANNEL = os.environ.get("JWT_BLOCKLIST_CHANNEL", "jwt:revoked")
+
+    # bcrypt cost; stored hashes with another cost are replaced on login
+    BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+    # Processes hashing passwords for each app worker, 0 hashes inline
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+
+    # Compiled when the app starts
+    EMAIL_TEMPLATES = ("email_template.html",)
+
+    # Scheduler emails go through the email_outbox table
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get("EMAIL_OUTBOX_BATCH_SIZE", 100))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", 6))
+    EMAIL_OUTBOX_BACKOFF_SECONDS = int(
+        os.environ.get("EMAIL_OUTBOX_BACKOFF_SECONDS", 30)
+    )
+    # How long a claimed batch is hidden from other drains; must outlast a batch
+    EMAIL_OUTBOX_CLAIM_SECONDS = int(os.environ.get("EMAIL_OUTBOX_CLAIM_SECONDS", 300))
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=48)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
 
+    # Run the reminder jobs inside the web process; turn off when a separate
+    # `flask worker` / `python -m api.worker` process runs them instead
+    SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+    SCHEDULER_THREADS = int(os.environ.get("SCHEDULER_THREADS", 6))
+
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
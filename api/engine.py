@@ -0,0 +1,115 @@
+"""
+Database engine options, pool monitoring and statement timeouts.
+
+SQLALCHEMY_ENGINE_OPTIONS is built from the DB_* settings: pool sizing and
+overflow, recycling, pre-ping and how long to wait for a free connection.
+Explicit SQLALCHEMY_ENGINE_OPTIONS entries still win. SQLite keeps the pool
+Flask-SQLAlchemy picks for it and only gets pre-ping and recycling.
+
+The pool records how long each checkout waited (``db.pool.checkout_wait``),
+how many connections are in use (``db.pool.checked_out``), which share of
+its capacity that is (``db.pool.saturation``) and how many checkouts gave up
+(``db.pool.timeouts``).
+
+On Postgres every connection runs with the statement timeout of the role
+using it: DB_STATEMENT_TIMEOUT_WEB_MS for requests, the longer
+DB_STATEMENT_TIMEOUT_WORKER_MS inside `database_role("worker")`, which the
+scheduled jobs run in.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from api import metrics
+
+_role = threading.local()
+
+
+class MonitoredQueuePool(QueuePool):
+    """A QueuePool that reports checkout waits and saturation as metrics."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.incr("db.pool.timeouts")
+            raise
+        finally:
+            metrics.observe("db.pool.checkout_wait", time.perf_counter() - started)
+            self._record_usage()
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._record_usage()
+
+    def _record_usage(self):
+        checked_out = self.checkedout()
+        metrics.set_gauge("db.pool.checked_out", checked_out)
+        # A negative max_overflow means no limit, so no saturation either
+        if self._max_overflow >= 0:
+            capacity = self.size() + self._max_overflow
+            metrics.set_gauge("db.pool.saturation", checked_out / capacity)
+
+
+def engine_options(config):
+    """The engine options the DB_* settings of `config` ask for."""
+    options = {
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+    }
+    uri = config.get("SQLALCHEMY_DATABASE_URI")
+    if not uri or make_url(uri).get_backend_name() == "sqlite":
+        return options
+    options.update(
+        poolclass=MonitoredQueuePool,
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+    )
+    return options
+
+
+@contextmanager
+def database_role(role):
+    """Run the block's database work with the statement timeout of `role`."""
+    previous = getattr(_role, "name", None)
+    _role.name = role
+    try:
+        yield
+    finally:
+        _role.name = previous
+
+
+def current_role():
+    return getattr(_role, "name", None) or "web"
+
+
+def watch_statement_timeouts(engine, config):
+    """Give every connection `engine` hands out its role's statement timeout."""
+    if engine.dialect.name != "postgresql":
+        return
+    timeouts = {
+        "web": config["DB_STATEMENT_TIMEOUT_WEB_MS"],
+        "worker": config["DB_STATEMENT_TIMEOUT_WORKER_MS"],
+    }
+
+    @event.listens_for(engine, "checkout")
+    def set_statement_timeout(dbapi_connection, record, proxy):
+        timeout = timeouts[current_role()]
+        # Only pay for the round trip when the connection changes role
+        if record.info.get("statement_timeout") == timeout:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"SET statement_timeout = {int(timeout)}")
+        finally:
+            cursor.close()
+        # A rollback on return to the pool would undo an uncommitted SET
+        dbapi_connection.commit()
+        record.info["statement_timeout"] = timeout
@@ -0,0 +1,62 @@
+import os
+import socket
+import uuid
+
+import redis
+
+
+class LeaderLease:
+    """
+    A Redis lease held by at most one process across the fleet.
+
+    The holder renews it on every tick. If the holder dies the key expires
+    after `ttl_seconds` and the next process that asks takes over.
+    """
+
+    def __init__(self, client, name, ttl_seconds):
+        self.client = client
+        self.key = f"lease:{name}"
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self._nonce = uuid.uuid4().hex
+
+    @property
+    def token(self):
+        # The pid keeps forked workers (gunicorn --preload) from sharing a token
+        return f"{socket.gethostname()}:{os.getpid()}:{self._nonce}"
+
+    def acquire(self):
+        """
+        Take the lease or renew it if this process already holds it.
+        Returns True while this process is the leader.
+        """
+        token = self.token
+        if self.client.set(self.key, token, nx=True, px=self.ttl_ms):
+            return True
+
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.get(self.key) != token:
+                    return False
+                pipe.multi()
+                pipe.pexpire(self.key, self.ttl_ms)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def release(self):
+        """
+        Give the lease up so another process can take over right away.
+        """
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.get(self.key) != self.token:
+                    return False
+                pipe.multi()
+                pipe.delete(self.key)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
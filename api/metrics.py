@@ -0,0 +1,79 @@
+"""
+In-process counters, gauges and timings.
+
+Values live in the memory of the process that records them; the web app
+exposes its own to SuperAdmins through the `/metrics` endpoint.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_timings = {}
+
+
+def incr(name, amount=1):
+    """Add `amount` to the counter `name`."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name, value):
+    """Record the latest value of the gauge `name`."""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, seconds):
+    """Record one duration sample for the timing `name`."""
+    with _lock:
+        timing = _timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["total"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+
+
+def snapshot():
+    """Return a copy of every metric recorded so far."""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {name: dict(timing) for name, timing in _timings.items()},
+        }
+
+
+def reset():
+    """Forget every recorded metric."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
+
+
+class QueryCount:
+    def __init__(self):
+        self.count = 0
+
+
+@contextmanager
+def count_queries(engine):
+    """
+    Count the statements the current thread sends to `engine` inside the block.
+    """
+    thread_id = threading.get_ident()
+    queries = QueryCount()
+
+    def before_cursor_execute(*args):
+        if threading.get_ident() == thread_id:
+            queries.count += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
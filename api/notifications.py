@@ -1,8 +1,293 @@
-from datetime import datetime, timedelta, date
-from flask import current_app as app
-from api import db
-from models import Medication, User
-from utils import send_email, log_message
+import os
+import queue
+import re
+import smtplib
+import threading
+import time
+from functools import lru_cache
+
 from colorama import Fore
+from markupsafe import escape
+
+from api import mail, metrics
+
+
+class EmailDispatcher:
+    """
+    Send emails from a bounded pool of background threads so that request
+    handlers only pay for putting a message on the queue.
+
+    The keyword arguments given to `enqueue` are passed to `send_email` as is,
+    so they must be plain values (no ORM objects). When the queue is full the
+    email is sent inline, slowing the caller down instead of dropping it.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.queue = None
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["email_dispatcher"] = self
+
+    def enqueue(self, **email):
+        """
+        Queue an email for `send_email`. Never raises: failures are logged and
+        counted in the `email.failed` metric.
+        """
+        if not self.app.config["EMAIL_DISPATCH_ASYNC"]:
+            self._send(email)
+            return
+
+        self._start()
+        try:
+            self.queue.put_nowait((time.perf_counter(), email))
+        except queue.Full:
+            metrics.incr("email.queue_full")
+            self._send(email)
+        finally:
+            metrics.set_gauge("email.queue_depth", self.queue.qsize())
+
+    def shutdown(self, timeout=10):
+        """Let the workers drain the queue, waiting at most `timeout` seconds."""
+        if not self._threads or self._pid != os.getpid():
+            return
+        for _ in self._threads:
+            self.queue.put((time.perf_counter(), None))
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self._threads = []
+
+    def _start(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.app.config["EMAIL_QUEUE_SIZE"])
+            self._threads = [
+                threading.Thread(
+                    target=self._work, name=f"email-dispatch-{index}", daemon=True
+                )
+                for index in range(self.app.config["EMAIL_DISPATCH_WORKERS"])
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def _work(self):
+        while True:
+            queued_at, email = self.queue.get()
+            try:
+                if email is None:
+                    return
+                metrics.observe(
+                    "email.queue_wait_seconds", time.perf_counter() - queued_at
+                )
+                self._send(email)
+            finally:
+                self.queue.task_done()
+                metrics.set_gauge("email.queue_depth", self.queue.qsize())
+
+    def _send(self, email):
+        from api.app import send_email, log_message
+
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                send_email(**email)
+        except Exception as e:
+            metrics.incr("email.failed")
+            log_message(f"Failed to send email to {email.get('to')}: {e}", Fore.RED)
+        else:
+            metrics.incr("email.sent")
+        finally:
+            metrics.observe("email.send_seconds", time.perf_counter() - started)
+
+
+class SMTPPool:
+    """
+    Keep authenticated SMTP sessions open and reuse them across messages
+    instead of paying a TLS handshake and login for every email.
+
+    At most MAIL_POOL_SIZE sessions are open at once. A session is closed
+    after MAIL_MAX_EMAILS_PER_CONNECTION messages or once it has sat idle for
+    MAIL_POOL_IDLE_SECONDS, since servers drop idle clients on their own.
+    A message that fails because the server hung up is retried once on a
+    fresh session.
+    """
+
+    # Failures that mean the session is gone rather than the message is bad
+    RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+    def __init__(self, mail=None, app=None):
+        self.mail = mail
+        self.app = None
+        self._idle = []
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["smtp_pool"] = self
+
+    def send(self, message):
+        """Send a Flask-Mail `message` over a pooled connection."""
+        self._start()
+        with self._slots:
+            connection = self._checkout()
+            try:
+                message.send(connection)
+            except self.RECONNECT_ERRORS:
+                metrics.incr("mail.reconnects")
+                self._close(connection)
+                connection = self._connect()
+                try:
+                    message.send(connection)
+                except Exception:
+                    self._close(connection)
+                    raise
+            except Exception:
+                # The session may be left mid-transaction, do not reuse it
+                self._close(connection)
+                raise
+            self._checkin(connection)
+
+    def close_all(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+        metrics.set_gauge("mail.pool_idle", 0)
+
+    def _start(self):
+        # Sockets must not be shared with a forked child
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._idle = []
+            self._slots = threading.BoundedSemaphore(self.app.config["MAIL_POOL_SIZE"])
+            self._pid = os.getpid()
+
+    def _checkout(self):
+        max_idle = self.app.config["MAIL_POOL_IDLE_SECONDS"]
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, released_at = self._idle.pop()
+                metrics.set_gauge("mail.pool_idle", len(self._idle))
+            if time.monotonic() - released_at < max_idle:
+                return connection
+            self._close(connection)
+        return self._connect()
+
+    def _checkin(self, connection):
+        if connection.num_emails >= self.app.config["MAIL_MAX_EMAILS_PER_CONNECTION"]:
+            self._close(connection)
+            return
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+            metrics.set_gauge("mail.pool_idle", len(self._idle))
+
+    def _connect(self):
+        connection = self.mail.connect()
+        connection.__enter__()
+        metrics.incr("mail.connections_opened")
+        return connection
+
+    def _close(self, connection):
+        if connection.host is None:
+            return
+        try:
+            connection.host.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.host.close()
+        connection.host = None
+
+
+class EmailTemplates:
+    """
+    Render email templates from static fragments that are built once.
+
+    The first time a template is used with a given set of static values
+    (footer, action text, ...) it is rendered with a placeholder in place of
+    each per-recipient field, and the output is split around the placeholders.
+    Later emails only escape their own values and join them between the
+    cached fragments. The template may print a per-recipient field or test it
+    for truthiness, but not filter or compare it.
+    """
+
+    # Everything else an email is rendered with is cached in the fragments.
+    # Subjects name the medication or appointment, so they vary per email too.
+    RECIPIENT_FIELDS = ("name", "subject", "body", "action_url")
+    PLACEHOLDER = re.compile(r"\x00(\w+)\x00")
+
+    def __init__(self, app=None):
+        self.app = None
+        self._fragments = lru_cache(maxsize=256)(self._build_fragments)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["email_templates"] = self
+        # Compile up front so the first reminder peak does not pay for it
+        for template_name in app.config["EMAIL_TEMPLATES"]:
+            app.jinja_env.get_template(template_name)
+
+    def render(self, template_name, **context):
+        """Render `template_name`, same output as `render_template`."""
+        env = self.app.jinja_env
+        if env.auto_reload:
+            # Templates may change on disk while debugging
+            return env.get_template(template_name).render(**context)
+
+        fields = {}
+        static = {}
+        for key, value in context.items():
+            if key in self.RECIPIENT_FIELDS and value:
+                fields[key] = value
+            else:
+                static[key] = value
+        fragments = self._fragments(
+            template_name, tuple(sorted(static.items())), tuple(sorted(fields))
+        )
+
+        autoescape = env.autoescape
+        if callable(autoescape):
+            autoescape = autoescape(template_name)
+        quote = escape if autoescape else str
+        parts = []
+        for index, fragment in enumerate(fragments):
+            # Static text sits at even positions, field names at odd ones
+            parts.append(quote(fields[fragment]) if index % 2 else fragment)
+        return "".join(parts)
+
+    def cache_info(self):
+        """The `functools.lru_cache` statistics of the fragment cache."""
+        return self._fragments.cache_info()
+
+    def _build_fragments(self, template_name, static, field_names):
+        context = dict(static)
+        context.update({field: f"\x00{field}\x00" for field in field_names})
+        rendered = self.app.jinja_env.get_template(template_name).render(**context)
+        return tuple(self.PLACEHOLDER.split(rendered))
 
 
+email_dispatcher = EmailDispatcher()
+email_templates = EmailTemplates()
+smtp_pool = SMTPPool(mail)
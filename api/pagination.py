@@ -0,0 +1,95 @@
+"""
+Keyset (cursor) pagination for the list endpoints.
+
+A page is ordered by ``(sort_key, id)`` and the cursor holds the values of
+the last row sent, so fetching page 1000 costs the same index seek as page 1.
+Cursors are opaque to clients; they just pass back the ``next_cursor`` of the
+previous response until it comes back as null.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+from flask import current_app, request
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not issued for this listing."""
+
+
+def encode_cursor(sort_key, values):
+    payload = [sort_key] + [
+        value.isoformat() if isinstance(value, (date, datetime)) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort_key, columns):
+    """Return the row values held by `cursor` or raise InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or payload[0] != sort_key:
+            raise InvalidCursor(cursor)
+        values = payload[1:]
+        if len(values) != len(columns):
+            raise InvalidCursor(cursor)
+        return [
+            (
+                column.type.python_type.fromisoformat(value)
+                if column.type.python_type in (date, datetime)
+                else value
+            )
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError, IndexError, json.JSONDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def page_size(requested=None):
+    """Clamp a requested page size to PAGE_SIZE_MAX, defaulting to PAGE_SIZE."""
+    try:
+        size = int(requested)
+    except (TypeError, ValueError):
+        return current_app.config["PAGE_SIZE"]
+    return max(1, min(size, current_app.config["PAGE_SIZE_MAX"]))
+
+
+def paginate(query, sort_column, descending=False, params=None):
+    """
+    Return one page of `query` ordered by (`sort_column`, id) as
+    ``(items, next_cursor)``. ``next_cursor`` is None on the last page.
+
+    `cursor` and `limit` are read from `params` (e.g. the JSON body) and
+    then from the query string. `sort_column` must not be nullable.
+    """
+    params = params or {}
+    cursor = params.get("cursor") or request.args.get("cursor")
+    limit = page_size(params.get("limit") or request.args.get("limit"))
+
+    model = query.column_descriptions[0]["entity"]
+    columns = [sort_column, model.id]
+    sort_key = f"{sort_column.key}:{'desc' if descending else 'asc'}"
+
+    if cursor:
+        values = decode_cursor(cursor, sort_key, columns)
+        if descending:
+            query = query.filter(tuple_(*columns) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+    order = [column.desc() if descending else column.asc() for column in columns]
+
+    # One extra row tells us whether there is a next page
+    items = query.order_by(None).order_by(*order).limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    next_cursor = encode_cursor(
+        sort_key, [getattr(last, column.key) for column in columns]
+    )
+    return items, next_cursor
@@ -0,0 +1,116 @@
+"""
+Password hashing off the request thread.
+
+bcrypt is deliberately slow and holds the CPU for the whole hash, so a burst
+of logins would starve every other request sharing the worker. Hashes and
+checks run in a pool of PASSWORD_HASH_WORKERS processes instead; request
+threads just wait on the result. With PASSWORD_HASH_WORKERS set to 0 they
+run inline, as before. If a child dies the pool is replaced and the call retried.
+
+The children are spawned, and spawned children re-import the parent's
+``__main__``. Under ``python -m api.app`` that is the app module itself, run
+as ``__mp_main__``, which therefore must not start the scheduler.
+
+The cost factor comes from BCRYPT_LOG_ROUNDS. Hashes made with another cost
+still verify, and `needs_rehash` tells the caller to store a new one.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from api import metrics
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["password_hasher"] = self
+
+    @property
+    def rounds(self):
+        return self.app.config["BCRYPT_LOG_ROUNDS"]
+
+    def hash(self, password):
+        """Return the bcrypt hash of `password` at the configured cost."""
+        return self._run(_hash, password.encode("utf-8"), self.rounds)
+
+    def check(self, password, hashed):
+        """True when `password` matches the bcrypt hash `hashed`."""
+        return self._run(_check, password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def needs_rehash(self, hashed):
+        """True when `hashed` was made with another cost than the configured one."""
+        # "$2b$12$<salt and hash>": the cost is the third field
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self._pid = None
+
+    def _run(self, func, *args):
+        executor = self._start()
+        if executor is None:
+            metrics.incr("passwords.inline")
+            return func(*args)
+        metrics.incr("passwords.pooled")
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            # A child died (e.g. to the OOM killer) and took the pool with it
+            metrics.incr("passwords.pool_restarts")
+            self._discard(executor)
+            return self._start().submit(func, *args).result()
+
+    def _discard(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                executor.shutdown(wait=False)
+                self._executor = None
+                self._pid = None
+
+    def _start(self):
+        workers = self.app.config["PASSWORD_HASH_WORKERS"]
+        if workers <= 0:
+            return None
+        # A pool does not survive a fork, so each gunicorn worker starts its own
+        if self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    # Forking a process that runs threads is unsafe, spawned
+                    # children start from a fresh interpreter
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._pid = os.getpid()
+        return self._executor
+
+
+password_hasher = PasswordHasher()
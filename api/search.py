@@ -0,0 +1,187 @@
+"""
+Ranked text search over doctors, medical records and medications.
+
+The doctor search and ``search`` on the record and medication listings match
+a substring of the text columns in SEARCH_COLUMNS, best match first, without
+the full scan a leading-wildcard ``ilike`` costs:
+
+* on Postgres, GIN ``pg_trgm`` indexes serve the ``ilike``, plus a fuzzy
+  ``<%`` word match that tolerates typos, and results are ranked by trigram
+  ``word_similarity``;
+* on SQLite, an FTS5 table with the trigram tokenizer mirrors the columns
+  (kept in sync by triggers) and results are ranked by ``bm25``.
+
+Both match substrings case-insensitively, like the ``ilike`` filters. The
+indexes are created by migrations e9c4a7b3d215 and f1a8c6e2b749 (through
+migrations/text_search.py) and, for ``db.create_all()``, by the DDL listeners
+below, which must emit the same DDL. Both kinds are maintained row by row as
+the tables are written.
+
+The FTS5 tables point at rows by their implicit rowid, and the TEXT primary
+keys of these tables do not pin it. A VACUUM may renumber rowids, and a
+restore from a dump does, after which the index would return the wrong rows.
+Run ``flask search vacuum`` instead of a bare VACUUM, and ``flask search
+rebuild`` after restoring a dump.
+"""
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import column, event, func, literal, literal_column, or_, table
+
+from api import db
+from models.doctor import Doctor
+from models.medical_records import MedicalRecords
+from models.medication import Medication
+
+SEARCH_COLUMNS = {
+    Doctor: ("full_name", "specialization", "address", "email"),
+    MedicalRecords: ("record_name", "diagnosis"),
+    Medication: ("name",),
+}
+
+# The FTS5 trigram tokenizer cannot match anything shorter
+MIN_FTS_LENGTH = 3
+
+
+def search_ddl(dialect, tablename, columns):
+    """The statements creating the search index of `tablename` on `dialect`."""
+    if dialect == "postgresql":
+        return ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+            f"CREATE INDEX IF NOT EXISTS ix_{tablename}_{name}_trgm "
+            f"ON {tablename} USING gin ({name} gin_trgm_ops)"
+            for name in columns
+        ]
+    if dialect != "sqlite":
+        return []
+
+    fts = f"{tablename}_fts"
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{name}" for name in columns)
+    old = ", ".join(f"old.{name}" for name in columns)
+    delete = (
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old});"
+    )
+    insert = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, "
+        f"content='{tablename}', content_rowid='rowid', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {tablename} "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {tablename} "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE ON {tablename} "
+        f"BEGIN {delete} {insert} END",
+        # Index the rows the table already holds
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def _create_search_index(target, connection, **kw):
+    columns = SEARCH_COLUMNS[_MODELS[target.name]]
+    for statement in search_ddl(connection.dialect.name, target.name, columns):
+        connection.exec_driver_sql(statement)
+
+
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {target.name}_fts")
+
+
+_MODELS = {model.__tablename__: model for model in SEARCH_COLUMNS}
+for _model in SEARCH_COLUMNS:
+    event.listen(_model.__table__, "after_create", _create_search_index)
+    event.listen(_model.__table__, "before_drop", _drop_search_index)
+
+
+def ranked_search(query, model, terms):
+    """
+    Narrow `query` over `model` to the rows matching `terms`, ordered best
+    match first. `terms` is either a string matched against every search
+    column of `model` or a dict of search column name to string, all of
+    which must match.
+    """
+    if isinstance(terms, str):
+        terms = {None: terms}
+    tablename = model.__tablename__
+    dialect = db.session.get_bind().dialect.name
+
+    def columns_of(name):
+        names = SEARCH_COLUMNS[model] if name is None else (name,)
+        return [getattr(model, name) for name in names]
+
+    if dialect == "postgresql":
+        similarities = []
+        for name, value in terms.items():
+            columns = columns_of(name)
+            # A substring, or a close enough word for typos; both use the index
+            query = query.filter(
+                or_(
+                    *[col.ilike(f"%{value}%") for col in columns],
+                    *[literal(value).op("<%")(col) for col in columns],
+                )
+            )
+            similarities += [func.word_similarity(value, col) for col in columns]
+        rank = (
+            func.greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        )
+        return query.order_by(rank.desc(), model.id)
+
+    phrases = []
+    for name, value in terms.items():
+        if dialect == "sqlite" and len(value) >= MIN_FTS_LENGTH:
+            # A quoted phrase is matched as a substring, not parsed
+            phrase = '"' + value.replace('"', '""') + '"'
+            phrases.append(phrase if name is None else f"{name}: {phrase}")
+        else:
+            query = query.filter(
+                or_(*[col.ilike(f"%{value}%") for col in columns_of(name)])
+            )
+    if not phrases:
+        return query.order_by(model.id)
+
+    fts = table(f"{tablename}_fts", column("rowid"), column("rank"))
+    return (
+        query.join(fts, fts.c.rowid == literal_column(f"{tablename}.rowid"))
+        .filter(literal_column(fts.name).op("MATCH")(" AND ".join(phrases)))
+        .order_by(fts.c.rank, model.id)
+    )
+
+
+def rebuild_search_indexes(connection):
+    """
+    Rebuild the SQLite search indexes from their tables and return the
+    names of the tables indexed. Postgres indexes never need it.
+    """
+    if connection.dialect.name != "sqlite":
+        return []
+    for tablename in _MODELS:
+        connection.exec_driver_sql(
+            f"INSERT INTO {tablename}_fts({tablename}_fts) VALUES ('rebuild')"
+        )
+    return list(_MODELS)
+
+
+search_cli = AppGroup("search", help="Maintain the text search indexes.")
+
+
+@search_cli.command("rebuild")
+def rebuild_command():
+    """Rebuild the SQLite search indexes, e.g. after restoring a dump."""
+    with db.engine.begin() as connection:
+        rebuilt = rebuild_search_indexes(connection)
+    click.echo(f"Rebuilt the search indexes of {', '.join(rebuilt) or 'nothing'}")
+
+
+@search_cli.command("vacuum")
+def vacuum_command():
+    """VACUUM the SQLite database, then rebuild the search indexes."""
+    if db.engine.dialect.name != "sqlite":
+        raise click.ClickException("Only SQLite databases need this")
+    # VACUUM cannot run inside a transaction
+    with db.engine.connect().execution_options(
+        isolation_level="AUTOCOMMIT"
+    ) as connection:
+        connection.exec_driver_sql("VACUUM")
+    with db.engine.begin() as connection:
+        rebuild_search_indexes(connection)
+    click.echo("Vacuumed the database and rebuilt the search indexes")
@@ -0,0 +1,208 @@
+"""
+Column-level serializers for the read-only list endpoints.
+
+Selecting just the columns a payload needs and turning each result row
+straight into a dict skips building ORM instances and the getattr-heavy
+`to_dict` methods. A serializer emits the same dict as the model's
+`to_dict`, or the subset of it the client asked for with ``fields=``.
+"""
+
+from datetime import date, datetime
+from functools import lru_cache
+from operator import itemgetter
+
+from flask import request
+
+from models.appointment import Appointment
+from models.doctor import Doctor
+from models.medical_records import MedicalRecords
+from models.medication import Medication
+from models.user import User
+
+# The keys each model's to_dict returns
+FIELDS = {
+    User: (
+        "id",
+        "full_name",
+        "phone_number",
+        "gender",
+        "address",
+        "email",
+        "age",
+        "profile_picture",
+        "is_active",
+        "bio",
+        "last_login",
+        "created_at",
+        "updated_at",
+        "role",
+    ),
+    Doctor: (
+        "id",
+        "full_name",
+        "phone_number",
+        "gender",
+        "address",
+        "email",
+        "age",
+        "profile_picture",
+        "specialization",
+        "years_of_experience",
+        "consultation_fee",
+        "is_active",
+        "bio",
+        "last_login",
+        "created_at",
+        "updated_at",
+    ),
+    MedicalRecords: (
+        "id",
+        "user_id",
+        "record_name",
+        "health_care_provider",
+        "type_of_record",
+        "diagnosis",
+        "notes",
+        "file_path",
+        "status",
+        "practitioner_name",
+        "last_added",
+        "last_updated",
+        "created_at",
+        "updated_at",
+    ),
+    Appointment: (
+        "id",
+        "start_time",
+        "end_time",
+        "status",
+        "description",
+        "user_id",
+        "doctor",
+        "created_at",
+        "updated_at",
+    ),
+    Medication: (
+        "name",
+        "duration",
+        "count",
+        "count_left",
+        "status",
+        "created_at",
+        "updated_at",
+    ),
+}
+
+# Keys of to_dict holding a whole related object, read through an outer join
+RELATED = {
+    Appointment: {"doctor": Doctor},
+}
+
+
+class InvalidFields(ValueError):
+    """The client asked for fields the model does not return."""
+
+
+class RowSerializer:
+    """
+    Serialize rows selected with `select` into dicts holding `fields`.
+
+    Everything that can be worked out ahead of time (which columns to
+    select, where each value sits in the row, which ones need isoformat) is
+    done once here, so serializing a row is a tuple lookup and a zip.
+    """
+
+    def __init__(self, model, fields):
+        columns = model.__table__.columns
+        related = RELATED.get(model, {})
+        selected = [name for name in fields if name in columns]
+        # The id is always selected, cursor pagination needs it
+        names = list(dict.fromkeys(["id"] + selected))
+
+        self.model = model
+        self.columns = [getattr(model, name) for name in names]
+        self.keys = tuple(selected)
+        # Related objects are selected after the model's own columns
+        self.joins = []
+        self.nested = []
+        for name in fields:
+            if name not in related:
+                continue
+            nested = serializer_for(related[name])
+            start = len(self.columns)
+            self.columns += [
+                column.label(f"{name}_{column.key}") for column in nested.columns
+            ]
+            self.joins.append(getattr(model, name))
+            self.nested.append((name, nested, start, len(self.columns)))
+        # Keys to_dict returns without a column behind them are always None
+        self.constants = {
+            name: None for name in fields if name not in columns and name not in related
+        }
+        self.timestamps = tuple(
+            name
+            for name in selected
+            if columns[name].type.python_type in (date, datetime)
+        )
+        positions = [names.index(name) for name in selected]
+        if len(positions) > 1:
+            self.values = itemgetter(*positions)
+        else:
+            # itemgetter returns a bare value, not a tuple, for a single index
+            self.values = lambda row: tuple(row[position] for position in positions)
+
+    def select(self, query, *extra):
+        """
+        Narrow `query` to the columns this serializer reads, plus `extra`
+        columns the caller needs (such as a pagination sort key).
+        """
+        for relationship in self.joins:
+            query = query.outerjoin(relationship)
+        selected = {column.key for column in self.columns}
+        extra = [column for column in extra if column.key not in selected]
+        return query.with_entities(*self.columns, *extra)
+
+    def __call__(self, row):
+        result = dict(zip(self.keys, self.values(row)))
+        for name in self.timestamps:
+            value = result[name]
+            if value is not None:
+                result[name] = value.isoformat()
+        if self.constants:
+            result.update(self.constants)
+        for name, nested, start, end in self.nested:
+            values = tuple(row[start:end])
+            # An outer join with nothing to join fills the columns with NULL
+            result[name] = nested(values) if values[0] is not None else {}
+        return result
+
+
+@lru_cache(maxsize=None)
+def serializer_for(model, fields=None):
+    """Return the cached serializer of `model` for `fields` (default: all)."""
+    return RowSerializer(model, fields or FIELDS[model])
+
+
+def requested_fields(model, params=None):
+    """
+    Return the fields the client asked for with ``fields`` in `params` (e.g.
+    the JSON body) or the query string, in `to_dict` order. Returns None
+    when it did not ask for a subset; raises InvalidFields on unknown names.
+    """
+    fields = (params or {}).get("fields") or request.args.get("fields")
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+        raise InvalidFields(fields)
+    names = {name.strip() for name in fields if name.strip()}
+    unknown = names - set(FIELDS[model])
+    if unknown or not names:
+        raise InvalidFields(sorted(unknown))
+    return tuple(name for name in FIELDS[model] if name in names)
+
+
+def request_serializer(model, params=None):
+    """The serializer for the fields of `model` this request asked for."""
+    return serializer_for(model, requested_fields(model, params))
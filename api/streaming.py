@@ -0,0 +1,55 @@
+"""
+Streamed JSON list responses.
+
+``?stream=true`` on the whole-table listings sends the usual envelope, but
+rows are read in batches of STREAM_BATCH_SIZE through a server-side cursor
+and written out as they are serialized, so memory stays flat however many
+rows the table holds.
+"""
+
+from itertools import islice
+
+from flask import Response, current_app, request, stream_with_context
+
+
+def wants_stream():
+    """True when the client asked for a streamed response."""
+    return request.args.get("stream", "").lower() == "true"
+
+
+def stream_list(query, serialize, envelope, key="data", status=200):
+    """
+    Return a response with `envelope` as its JSON body and every row of
+    `query`, passed through `serialize`, as the list under `key`.
+    """
+
+    def dumps(obj):
+        return current_app.json.dumps(obj, separators=(",", ":"))
+
+    batch_size = current_app.config["STREAM_BATCH_SIZE"]
+    # yield_per also turns on stream_results, a server-side cursor on psycopg2
+    rows = query.yield_per(batch_size)
+    # Serialize the envelope once and stream the rows in place of a placeholder
+    placeholder = "\x00rows\x00"
+    prefix, suffix = dumps(dict(envelope, **{key: placeholder})).split(
+        dumps(placeholder), 1
+    )
+
+    def generate():
+        yield prefix + "["
+        iterator = iter(rows)
+        separator = ""
+        while True:
+            batch = [dumps(serialize(row)) for row in islice(iterator, batch_size)]
+            if not batch:
+                break
+            # One chunk per fetched batch
+            yield separator + ",".join(batch)
+            separator = ","
+        yield "]" + suffix
+
+    return Response(
+        stream_with_context(generate()),
+        status=status,
+        mimetype=current_app.json.mimetype,
+    )
@@ -15,6 +15,25 @@ def client():
         db.session.remove()
         db.drop_all()  # Clean up after tests
 
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Point the app's Redis users at an in-memory fakeredis server."""
+    import fakeredis
+    from api.app import SCHEDULED_JOBS
+    from api.blocklist import token_blocklist
+
+    server = fakeredis.FakeStrictRedis(decode_responses=True)
+    for job in SCHEDULED_JOBS:
+        monkeypatch.setattr(job.lease, "client", server)
+    monkeypatch.setattr("api.blocklist.token_blocklist.client", server)
+    monkeypatch.setattr("api.cache.doctor_cache.client", server)
+    monkeypatch.setattr("api.cache.dashboard_cache.client", server)
+    monkeypatch.setattr("api.cache.redis_client", server)
+    yield server
+    # Stop listening for revocations on this server
+    token_blocklist.close()
+
+
 def create_appointment(start_offset=0, end_offset=1, status="Notified"):
     """Helper function to create an appointment in the database."""
     start_time = (datetime.utcnow() + timedelta(hours=start_offset)).time()
@@ -53,3 +72,1367 @@ def test_appointment_invalid_time(client):
     json_data = response.get_json()
     assert response.status_code == 400
     assert json_data['error'] == "INVALID_APPOINTMENT_STATUS"
+
+
+def test_check_medications_walks_the_reminder_queue(client, fake_redis, monkeypatch):
+    """Doses are sent once each, missed ones skipped, and edits reschedule."""
+    from api.app import check_medications
+    from models.email_outbox import EmailOutbox
+    from models.medication import Medication
+    from models.user import User
+
+    clock = {"now": datetime(2026, 1, 5, 7, 58)}
+    monkeypatch.setattr("api.app.local_now", lambda: clock["now"])
+    monkeypatch.setattr("models.medication.local_now", lambda: clock["now"])
+
+    user = User(full_name="John", email="john@example.com", password="x")
+    db.session.add(user)
+    db.session.flush()
+    duration = [
+        {"time": "08:00", "when": "morning"},
+        {"time": "20:00", "when": "night"},
+    ]
+    medication = Medication(
+        name="Aspirin", duration=duration, count=2, count_left=2, user_id=user.id
+    )
+    db.session.add(medication)
+    db.session.commit()
+    assert medication.next_dose_at == datetime(2026, 1, 5, 8, 0)
+
+    def sweep(now):
+        clock["now"] = now
+        check_medications()
+        db.session.expire_all()
+        return db.session.get(Medication, medication.id)
+
+    # Sent once, then queued for the evening dose
+    current = sweep(datetime(2026, 1, 5, 8, 1))
+    assert (current.count_left, current.status) == (1, "ongoing")
+    assert current.next_dose_at == datetime(2026, 1, 5, 20, 0)
+    assert sweep(datetime(2026, 1, 5, 8, 2)).count_left == 1
+    assert EmailOutbox.query.count() == 1
+
+    # The scheduler was down all evening: skip the dose instead of replaying it
+    current = sweep(datetime(2026, 1, 6, 9, 0))
+    assert current.count_left == 1
+    assert current.next_dose_at == datetime(2026, 1, 6, 20, 0)
+    assert EmailOutbox.query.count() == 1
+
+    # The last dose completes the course and leaves the queue
+    current = sweep(datetime(2026, 1, 6, 20, 1))
+    assert (current.count_left, current.status) == (0, "completed")
+    assert current.next_dose_at is None
+    assert EmailOutbox.query.count() == 3
+
+    # Edits to the schedule or the status move the next dose
+    clock["now"] = datetime(2026, 1, 7, 9, 0)
+    edited = Medication(
+        name="Zinc", duration=duration, count=5, count_left=5, user_id=user.id
+    )
+    db.session.add(edited)
+    db.session.commit()
+    assert edited.next_dose_at == datetime(2026, 1, 7, 20, 0)
+    edited.duration = [{"time": "13:30", "when": "afternoon"}]
+    db.session.commit()
+    assert edited.next_dose_at == datetime(2026, 1, 7, 13, 30)
+    edited.status = "completed"
+    db.session.commit()
+    assert edited.next_dose_at is None
+    edited.status = "upcoming"
+    db.session.commit()
+    assert edited.next_dose_at == datetime(2026, 1, 7, 13, 30)
+
+
+def create_appointment_batch(size):
+    """Helper creating `size` users, each with one appointment per sweep transition."""
+    from api.app import local_now
+    from models.doctor import Doctor
+    from models.user import User
+
+    now = local_now()
+    doctor = Doctor(full_name="Dr Who", email=f"doctor{size}@example.com", password="x")
+    db.session.add(doctor)
+    for index in range(size):
+        user = User(full_name="John", email=f"john{size}.{index}@example.com", password="x")
+        db.session.add(user)
+        db.session.flush()
+        for status, start, end in [
+            ("Upcoming", 10, 60),
+            ("30mins_Notified", -10, 30),
+            ("Ongoing", -60, -5),
+            ("Notified", -60, -5),
+        ]:
+            db.session.add(
+                Appointment(
+                    user_id=user.id,
+                    doctor_id=doctor.id,
+                    status=status,
+                    start_time=now + timedelta(minutes=start),
+                    end_time=now + timedelta(minutes=end),
+                )
+            )
+    db.session.commit()
+
+
+def test_check_appointments_query_count_is_constant(client, fake_redis, monkeypatch):
+    """The appointment sweep costs the same number of queries for 1 or 25 users."""
+    from api import metrics
+    from api.app import check_appointments
+    from models.email_outbox import EmailOutbox
+
+    query_counts = []
+    for size in (1, 25):
+        create_appointment_batch(size)
+        check_appointments()
+        query_counts.append(
+            metrics.snapshot()["gauges"]["scheduler.check_appointments.queries"]
+        )
+
+    assert EmailOutbox.query.count() == 4 * (1 + 25)
+    assert query_counts[0] == query_counts[1]
+
+
+def test_appointment_reminders_fire_once_per_window(client, fake_redis, monkeypatch):
+    """Each transition sends its email on the tick it happens, never again."""
+    from api.app import check_appointments, local_now
+    from models.email_outbox import EmailOutbox
+
+    from models.user import User
+
+    now = local_now()
+    monkeypatch.setattr("api.app.local_now", lambda: now)
+    user = User(full_name="John", email="john@example.com", password="x")
+    db.session.add(user)
+    db.session.flush()
+    soon = Appointment(
+        user_id=user.id,
+        status="Upcoming",
+        start_time=now + timedelta(minutes=10),
+        end_time=now + timedelta(minutes=40),
+    )
+    later = Appointment(
+        user_id=user.id,
+        status="Upcoming",
+        start_time=now + timedelta(minutes=60),
+        end_time=now + timedelta(minutes=90),
+    )
+    db.session.add_all([soon, later])
+    db.session.commit()
+
+    def sweep():
+        check_appointments()
+        db.session.expire_all()
+        return [e.subject for e in EmailOutbox.query.order_by(EmailOutbox.created_at)]
+
+    assert sweep() == ["Upcoming Appointment Reminder"]
+    assert sweep() == ["Upcoming Appointment Reminder"]
+    assert (soon.status, later.status) == ("30mins_Notified", "Upcoming")
+
+    # Once it starts it moves on to the next window, again only once
+    monkeypatch.setattr("api.app.local_now", lambda: now + timedelta(minutes=15))
+    expected = ["Upcoming Appointment Reminder", "Your Appointment is Ongoing"]
+    assert sweep() == expected
+    assert sweep() == expected
+    assert (soon.status, later.status) == ("Notified", "Upcoming")
+
+
+def test_transition_claims_rows_in_one_statement(client):
+    """A transition moves every matching row with one UPDATE and claims each once."""
+    from api import metrics
+    from api.app import local_now, transition_appointments
+
+    now = local_now()
+    due = [
+        Appointment(
+            status="Notified",
+            start_time=now - timedelta(hours=2),
+            end_time=now - timedelta(hours=1),
+        )
+        for _ in range(3)
+    ]
+    running = Appointment(
+        status="Notified", start_time=now, end_time=now + timedelta(hours=1)
+    )
+    db.session.add_all(due + [running])
+    db.session.commit()
+
+    with metrics.count_queries(db.engine) as queries:
+        claimed = transition_appointments(
+            "Notified", "Missed", Appointment.end_time < now
+        )
+    assert queries.count == 1
+    assert sorted(claimed) == sorted(appointment.id for appointment in due)
+
+    # Claimed rows left the source status, so a second sweep gets none of them
+    assert (
+        transition_appointments("Notified", "Missed", Appointment.end_time < now) == []
+    )
+    db.session.commit()
+    db.session.expire_all()
+    assert running.status == "Notified"
+    assert {appointment.status for appointment in due} == {"Missed"}
+
+
+def test_leader_lease_single_holder_and_failover(fake_redis):
+    """Only one process holds a job lease; another takes over once it is released or expires."""
+    import time
+    from api.lease import LeaderLease
+
+    leader = LeaderLease(fake_redis, "scheduler:check_medications", ttl_seconds=0.2)
+    follower = LeaderLease(fake_redis, "scheduler:check_medications", ttl_seconds=0.2)
+
+    assert leader.acquire()
+    assert not follower.acquire()
+    assert leader.acquire()  # renewal by the current holder
+
+    leader.release()
+    assert follower.acquire()
+    assert not leader.acquire()
+
+    time.sleep(0.3)  # the follower "dies" and its lease expires
+    assert leader.acquire()
+
+
+def test_scheduled_job_skipped_without_lease(client, fake_redis):
+    """A process that does not hold the lease does not run the sweep."""
+    from api.app import check_appointments
+
+    from models.email_outbox import EmailOutbox
+
+    fake_redis.set(check_appointments.lease.key, "another-process")
+    create_appointment_batch(1)
+
+    check_appointments()
+
+    assert EmailOutbox.query.count() == 0
+    assert Appointment.query.filter_by(status="Upcoming").count() == 1
+
+
+def test_worker_command_runs_the_scheduled_jobs(client, fake_redis, monkeypatch):
+    """`flask worker` schedules every job on its own scheduler and runs them."""
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.schedulers.blocking import BlockingScheduler
+    from api.app import SCHEDULED_JOBS
+    from models.email_outbox import EmailOutbox
+
+    scheduled = {}
+
+    def start(scheduler):
+        # Run one tick of every job instead of blocking forever
+        for job in scheduler.get_jobs():
+            scheduled[job.func] = job.trigger.interval.total_seconds()
+            job.func()
+
+    monkeypatch.setattr(BlockingScheduler, "start", start)
+    # Keep the test process's own scheduler out of it
+    monkeypatch.setattr("api.app.scheduler", BackgroundScheduler())
+    monkeypatch.setattr("api.app.send_email", lambda **kwargs: None)
+    create_appointment_batch(1)
+
+    result = app.test_cli_runner().invoke(args=["worker"])
+
+    assert result.exit_code == 0, result.output
+    assert scheduled == {job: job.seconds for job in SCHEDULED_JOBS}
+    db.session.expire_all()
+    assert Appointment.query.filter_by(status="Upcoming").count() == 0
+    assert EmailOutbox.query.filter_by(status="pending").count() == 0
+
+
+@pytest.fixture
+def dispatcher(monkeypatch):
+    """A fresh EmailDispatcher with one worker and room for one queued email."""
+    from api.notifications import EmailDispatcher
+
+    monkeypatch.setitem(app.config, "EMAIL_DISPATCH_ASYNC", True)
+    monkeypatch.setitem(app.config, "EMAIL_DISPATCH_WORKERS", 1)
+    monkeypatch.setitem(app.config, "EMAIL_QUEUE_SIZE", 1)
+    monkeypatch.setitem(app.extensions, "email_dispatcher", None)
+    dispatcher = EmailDispatcher(app)
+    yield dispatcher
+    dispatcher.shutdown()
+
+
+def test_email_dispatcher_sends_off_the_request_thread(dispatcher, monkeypatch):
+    """Queued emails go out on a worker; a full queue sends inline instead."""
+    import threading
+    from api import metrics
+
+    started, release = threading.Event(), threading.Event()
+    sent = []
+
+    def send_email(**email):
+        if threading.current_thread() is not threading.main_thread():
+            started.set()
+            release.wait(5)
+        sent.append((email["to"], threading.current_thread().name))
+
+    monkeypatch.setattr("api.app.send_email", send_email)
+    metrics.reset()
+
+    dispatcher.enqueue(to="first@example.com")
+    assert started.wait(5)
+    assert sent == []  # the caller did not wait for the send
+    dispatcher.enqueue(to="queued@example.com")
+    dispatcher.enqueue(to="inline@example.com")
+    assert sent == [("inline@example.com", "MainThread")]
+    assert metrics.snapshot()["counters"]["email.queue_full"] == 1
+
+    release.set()
+    dispatcher.queue.join()
+    assert [to for to, _ in sent] == [
+        "inline@example.com",
+        "first@example.com",
+        "queued@example.com",
+    ]
+    assert {thread for _, thread in sent[1:]} == {"email-dispatch-0"}
+
+
+def test_signup_commits_when_smtp_fails(client, monkeypatch):
+    """A failing SMTP server costs the email, not the account."""
+    import smtplib
+    from api import metrics
+    from models.user import User
+
+    def send(message):
+        raise smtplib.SMTPServerDisconnected("gone")
+
+    monkeypatch.setitem(app.config, "EMAIL_DISPATCH_ASYNC", False)
+    monkeypatch.setitem(app.config, "PASSWORD_HASH_WORKERS", 0)
+    monkeypatch.setitem(app.config, "BCRYPT_LOG_ROUNDS", 4)
+    monkeypatch.setattr("api.notifications.smtp_pool.send", send)
+    metrics.reset()
+
+    response = client.post(
+        "/api/signup",
+        json={"full_name": "John", "email": "john@example.com", "password": "pw"},
+    )
+
+    assert response.status_code == 201
+    assert User.query.filter_by(email="john@example.com").count() == 1
+    assert metrics.snapshot()["counters"]["email.failed"] == 1
+
+
+def test_metrics_require_a_superadmin(client, fake_redis):
+    """/metrics is only served to SuperAdmin tokens."""
+    from flask_jwt_extended import create_access_token
+
+    def get(role=None):
+        if role is None:
+            return client.get("/metrics")
+        token = create_access_token(identity="1", additional_claims={"role": role})
+        return client.get("/metrics", headers={"Authorization": f"Bearer {token}"})
+
+    assert get().status_code == 401
+    assert get("doctor").status_code == 403
+    response = get("SuperAdmin")
+    assert response.status_code == 200
+    assert set(response.get_json()) == {"counters", "gauges", "timings"}
+
+
+def test_drain_email_outbox_retries_then_gives_up(client, fake_redis, monkeypatch):
+    """Failed outbox sends back off and end up dead; successful ones are marked sent."""
+    from api.app import drain_email_outbox
+    from models.email_outbox import EmailOutbox
+
+    monkeypatch.setitem(app.config, "EMAIL_OUTBOX_MAX_ATTEMPTS", 2)
+    EmailOutbox.enqueue(to="ok@example.com", name="Ok", subject="Hi", body="Body")
+    failing = EmailOutbox.enqueue(
+        to="bad@example.com", name="Bad", subject="Hi", body="Body"
+    )
+    db.session.commit()
+
+    def send_email(**kwargs):
+        if kwargs["to"] == "bad@example.com":
+            raise ConnectionError("SMTP down")
+
+    monkeypatch.setattr("api.app.send_email", send_email)
+
+    drain_email_outbox()
+    statuses = {e.recipient: (e.status, e.attempts) for e in EmailOutbox.query.all()}
+    assert statuses == {
+        "ok@example.com": ("sent", 0),
+        "bad@example.com": ("pending", 1),
+    }
+
+    # Not due again until its backoff has elapsed
+    drain_email_outbox()
+    assert db.session.get(EmailOutbox, failing.id).attempts == 1
+
+    EmailOutbox.query.filter_by(id=failing.id).update(
+        {"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.session.commit()
+    drain_email_outbox()
+    db.session.expire_all()
+    assert db.session.get(EmailOutbox, failing.id).status == "dead"
+
+
+def test_drain_email_outbox_claims_before_sending(client, fake_redis, monkeypatch):
+    """Claimed emails are hidden from other drains until their claim runs out."""
+    from api.app import claim_email_outbox, drain_email_outbox
+    from models.email_outbox import EmailOutbox
+
+    email = EmailOutbox.enqueue(to="ok@example.com", name="Ok", subject="Hi", body="B")
+    db.session.commit()
+    now = datetime.utcnow()
+    claims = []
+
+    def send_email(**kwargs):
+        # Another process draining while this send is still in flight
+        claims.append(claim_email_outbox(datetime.utcnow()))
+
+    monkeypatch.setattr("api.app.send_email", send_email)
+    drain_email_outbox()
+    db.session.expire_all()
+    assert claims == [[]]
+    assert (email.status, email.attempts) == ("sent", 0)
+
+    # A claim whose drain died before recording the outcome is due again
+    email.status = "sending"
+    email.next_attempt_at = now + timedelta(seconds=10)
+    db.session.commit()
+    assert claim_email_outbox(now) == []
+    later = now + timedelta(seconds=11)
+    assert claim_email_outbox(later) == [email.id]
+    db.session.expire_all()
+    assert email.next_attempt_at == later + timedelta(
+        seconds=app.config["EMAIL_OUTBOX_CLAIM_SECONDS"]
+    )
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """Run a local SMTP server and point Flask-Mail at it."""
+    import socket
+
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    from api.notifications import smtp_pool
+
+    class Handler:
+        def __init__(self):
+            self.messages = []
+
+        async def handle_DATA(self, server, session, envelope):
+            self.messages.append((id(session), envelope.rcpt_tos))
+            return "250 OK"
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = Handler()
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    state = app.extensions["mail"]
+    monkeypatch.setattr(state, "server", "127.0.0.1")
+    monkeypatch.setattr(state, "port", port)
+    monkeypatch.setattr(state, "use_ssl", False)
+    monkeypatch.setattr(state, "use_tls", False)
+    monkeypatch.setattr(state, "username", None)
+    monkeypatch.setattr(state, "suppress", False)
+    monkeypatch.setattr(state, "default_sender", "vault@example.com")
+    yield handler
+    smtp_pool.close_all()
+    controller.stop()
+
+
+def test_smtp_pool_reuses_connections(client, smtp_server, monkeypatch):
+    """Messages share SMTP sessions up to the per-connection limit."""
+    from flask_mail import Message
+    from api.notifications import smtp_pool
+
+    monkeypatch.setitem(app.config, "MAIL_MAX_EMAILS_PER_CONNECTION", 2)
+    for index in range(5):
+        smtp_pool.send(Message("Hi", recipients=[f"user{index}@example.com"]))
+
+    sessions = [session for session, _ in smtp_server.messages]
+    assert len(sessions) == 5
+    assert len(set(sessions)) == 3
+
+
+def test_smtp_pool_reconnects_after_disconnect(client, smtp_server):
+    """A session the server dropped is replaced and the message still goes out."""
+    from flask_mail import Message
+    from api.notifications import smtp_pool
+
+    smtp_pool.send(Message("Hi", recipients=["first@example.com"]))
+    connection, _ = smtp_pool._idle[-1]
+    connection.host.close()
+
+    smtp_pool.send(Message("Hi", recipients=["second@example.com"]))
+
+    assert [rcpt for _, rcpt in smtp_server.messages] == [
+        ["first@example.com"],
+        ["second@example.com"],
+    ]
+    assert len({session for session, _ in smtp_server.messages}) == 2
+
+
+def test_email_fragments_match_render_template(client):
+    """Rendering from cached fragments gives the same HTML as render_template."""
+    from flask import render_template
+    from api.bench import EMAIL_TYPES
+    from api.notifications import email_templates
+
+    for make_context in EMAIL_TYPES.values():
+        for index in range(3):
+            context = make_context(index)
+            context["name"] = f"<b>Patient {index}</b> & co"
+            assert email_templates.render(
+                "email_template.html", **context
+            ) == render_template("email_template.html", **context)
+
+    context = dict(EMAIL_TYPES["appointment"](0), action_url="")
+    assert email_templates.render("email_template.html", **context) == (
+        render_template("email_template.html", **context)
+    )
+
+    # Reminders for different medications share one set of fragments
+    before = email_templates.cache_info()
+    for index in range(20):
+        email_templates.render("email_template.html", **EMAIL_TYPES["reminder"](index))
+    assert email_templates.cache_info().misses - before.misses <= 1
+
+
+def test_listing_appointments_query_count_is_constant(client, fake_redis, monkeypatch):
+    """Listing appointments loads their doctors in the same query, however many."""
+    from flask_jwt_extended import create_access_token
+    from api import metrics
+    from api.cache import refresh_user_count
+    from models.doctor import Doctor
+    from models.user import User
+
+    monkeypatch.setitem(app.config, "PAGE_SIZE_MAX", 500)
+    monkeypatch.setitem(app.config, "DASHBOARD_UPCOMING_LIMIT", 500)
+    # Counted by the refresh job, not by the dashboard
+    refresh_user_count()
+    user = User(full_name="Jane", email="jane@example.com", password="x")
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+    start_time = datetime.now() + timedelta(days=1)
+
+    def add_appointments(first, last):
+        for index in range(first, last):
+            doctor = Doctor(
+                full_name="Dr", email=f"dr{index}@example.com", password="x"
+            )
+            db.session.add(doctor)
+            db.session.flush()
+            db.session.add(
+                Appointment(
+                    user_id=user_id,
+                    doctor_id=doctor.id,
+                    start_time=start_time,
+                    end_time=start_time + timedelta(hours=1),
+                )
+            )
+        db.session.commit()
+        db.session.expunge_all()
+
+    query_counts = []
+    for first, last in [(0, 5), (5, 500)]:
+        add_appointments(first, last)
+        with metrics.count_queries(db.engine) as listing:
+            response = client.post(
+                f"/api/get_appointments/{user_id}",
+                json={"limit": 500},
+                headers=headers,
+            )
+        with metrics.count_queries(db.engine) as dashboard:
+            dashboard_response = client.get("/api/dashboard", headers=headers)
+        assert len(response.get_json()["data"]) == last
+        assert all(a["doctor"] for a in response.get_json()["data"])
+        upcoming = dashboard_response.get_json()["data"]
+        assert len(upcoming["list_of_upcoming_appointments"]) == last
+        query_counts.append((listing.count, dashboard.count))
+
+    assert query_counts[0] == query_counts[1]
+
+
+def test_cursor_pagination_walks_every_row_once(client, fake_redis):
+    """Following next_cursor visits each row once, even when sort keys tie."""
+    from flask_jwt_extended import create_access_token
+    from models.extra import Subscriber
+    from models.medical_records import MedicalRecords
+    from models.user import User
+
+    def walk(fetch):
+        ids, cursor = [], None
+        while True:
+            body = fetch(cursor)
+            ids += [row["id"] for row in body["data"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                return ids
+
+    for index in range(7):
+        db.session.add(Subscriber(email=f"reader{index}@example.com"))
+    db.session.commit()
+    subscriber_ids = walk(
+        lambda cursor: client.get(
+            "/api/subscribers", query_string={"limit": 3, "cursor": cursor or ""}
+        ).get_json()
+    )
+    assert sorted(subscriber_ids) == sorted(s.id for s in Subscriber.query.all())
+    assert len(subscriber_ids) == 7
+
+    user = User(full_name="Jane", email="jane@example.com", password="x")
+    db.session.add(user)
+    db.session.flush()
+    added = datetime(2024, 1, 1)
+    for index in range(5):
+        db.session.add(
+            MedicalRecords(
+                user_id=user.id,
+                record_name=f"Record {index}",
+                health_care_provider="Clinic",
+                type_of_record="Lab",
+                last_added=added if index < 3 else added + timedelta(days=index),
+            )
+        )
+    db.session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+    record_ids = walk(
+        lambda cursor: client.post(
+            f"/api/user_records/{user.id}",
+            json={"limit": 2, "sort_order": "desc", "cursor": cursor},
+            headers=headers,
+        ).get_json()
+    )
+    expected = MedicalRecords.query.order_by(
+        MedicalRecords.last_added.desc(), MedicalRecords.id.desc()
+    )
+    assert record_ids == [record.id for record in expected]
+
+    response = client.get("/api/subscribers", query_string={"cursor": "bogus"})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "INVALID_CURSOR"
+
+
+def test_streamed_listing_matches_envelope(client, monkeypatch):
+    """?stream=true returns every row in the usual envelope, in batches."""
+    from models.extra import Inquiry
+
+    monkeypatch.setitem(app.config, "STREAM_BATCH_SIZE", 4)
+    for index in range(10):
+        db.session.add(Inquiry(name=f"N{index}", email="a@b.c", message="Hi"))
+    db.session.commit()
+
+    response = client.get("/api/inquiries", query_string={"stream": "true"})
+
+    assert response.is_streamed
+    body = response.get_json()
+    assert body["status"] is True
+    assert body["msg"] == "Inquiries retrieved successfully"
+    assert sorted(row["name"] for row in body["data"]) == [f"N{i}" for i in range(10)]
+
+
+def test_row_serializers_match_to_dict(client):
+    """The column serializers return exactly what each model's to_dict does."""
+    from api.serializers import FIELDS, serializer_for
+    from models.doctor import Doctor
+    from models.medical_records import MedicalRecords
+    from models.medication import Medication
+    from models.user import User
+
+    user = User(full_name="Jane", email="jane@example.com", password="x")
+    doctor = Doctor(full_name="Dr", email="dr@example.com", password="x")
+    db.session.add_all([user, doctor])
+    db.session.flush()
+    now = datetime.now()
+    db.session.add_all(
+        [
+            Appointment(user_id=user.id, start_time=now, end_time=now),
+            Appointment(
+                user_id=user.id, doctor_id=doctor.id, start_time=now, end_time=now
+            ),
+            MedicalRecords(
+                user_id=user.id,
+                record_name="Blood test",
+                health_care_provider="Clinic",
+                type_of_record="Lab",
+                notes="All good",
+            ),
+            Medication(
+                user_id=user.id,
+                name="Amoxicillin",
+                duration=[{"time": "08:00", "when": "morning"}],
+                count=3,
+                count_left=3,
+            ),
+        ]
+    )
+    db.session.commit()
+
+    for model in FIELDS:
+        serializer = serializer_for(model)
+        rows = serializer.select(model.query.order_by(model.id)).all()
+        objects = model.query.order_by(model.id).all()
+        assert [serializer(row) for row in rows] == [o.to_dict() for o in objects]
+
+
+def test_fields_narrow_the_select_and_the_payload(client, fake_redis):
+    """fields= returns only the asked-for keys and selects only their columns."""
+    from flask_jwt_extended import create_access_token
+    from models.medical_records import MedicalRecords
+    from models.user import User
+
+    user = User(full_name="Jane", email="jane@example.com", password="x")
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(
+        MedicalRecords(
+            user_id=user.id,
+            record_name="Blood test",
+            health_care_provider="Clinic",
+            type_of_record="Lab",
+            notes="A long note",
+        )
+    )
+    db.session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    db.event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        response = client.get(
+            f"/api/user_records/{user.id}",
+            query_string={"fields": "record_name,type_of_record,last_added"},
+            headers=headers,
+        )
+    finally:
+        db.event.remove(db.engine, "before_cursor_execute", listener)
+
+    assert response.status_code == 200
+    assert response.get_json()["data"] == [
+        {
+            "record_name": "Blood test",
+            "type_of_record": "Lab",
+            "last_added": MedicalRecords.query.one().last_added.isoformat(),
+        }
+    ]
+    listing = [sql for sql in statements if "FROM medical_records" in sql]
+    assert listing and "notes" not in listing[0]
+
+    response = client.get(
+        f"/api/user_records/{user.id}",
+        query_string={"fields": "record_name,password"},
+        headers=headers,
+    )
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "INVALID_FIELDS"
+
+
+def test_conditional_get_answers_304_until_data_changes(client, fake_redis):
+    """If-None-Match gets a 304 until a row behind the response changes."""
+    from flask_jwt_extended import create_access_token
+    from models.medication import Medication
+    from models.user import User
+
+    user = User(full_name="Jane", email="jane@example.com", password="x")
+    db.session.add(user)
+    db.session.flush()
+    medication = Medication(
+        user_id=user.id, name="Amoxicillin", duration=[], count=3, count_left=3
+    )
+    db.session.add(medication)
+    db.session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+
+    for url in (f"/api/medications/{user.id}", "/api/dashboard"):
+        first = client.get(url, headers=headers)
+        assert first.status_code == 200
+        assert first.headers["ETag"] and first.headers["Last-Modified"]
+
+        conditional = dict(headers, **{"If-None-Match": first.headers["ETag"]})
+        again = client.get(url, headers=conditional)
+        assert again.status_code == 304
+        assert again.get_data() == b""
+
+        medication.count_left -= 1
+        db.session.commit()
+        changed = client.get(url, headers=conditional)
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != first.headers["ETag"]
+
+    # The same request for another subset of fields is a different response
+    narrowed = client.get(
+        f"/api/medications/{user.id}",
+        query_string={"fields": "name"},
+        headers=dict(headers, **{"If-None-Match": changed.headers["ETag"]}),
+    )
+    assert narrowed.status_code == 200
+
+
+def test_compression_negotiated_above_min_size(client, fake_redis, monkeypatch):
+    """Large JSON bodies are gzipped for clients that accept it, others are not."""
+    import gzip
+
+    from flask_jwt_extended import create_access_token
+    from models.medication import Medication
+    from models.user import User
+
+    monkeypatch.setitem(app.config, "COMPRESS_ENABLED", True)
+    monkeypatch.setattr("api.compression.brotli", None)
+    user = User(full_name="Jane", email="jane@example.com", password="x")
+    db.session.add(user)
+    db.session.flush()
+    for i in range(30):
+        db.session.add(
+            Medication(
+                user_id=user.id, name=f"Drug {i}", duration=[], count=3, count_left=3
+            )
+        )
+    db.session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+    url = f"/api/medications/{user.id}"
+
+    plain = client.get(url, headers=headers)
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    gzipped = client.get(url, headers=dict(headers, **{"Accept-Encoding": "gzip"}))
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert len(gzipped.get_data()) < len(plain.get_data())
+    assert gzip.decompress(gzipped.get_data()) == plain.get_data()
+
+    monkeypatch.setitem(app.config, "COMPRESS_MIN_SIZE", len(plain.get_data()) + 1)
+    small = client.get(url, headers=dict(headers, **{"Accept-Encoding": "gzip"}))
+    assert "Content-Encoding" not in small.headers
+    assert small.get_data() == plain.get_data()
+
+
+def test_doctor_cache_reads_through_and_invalidates(client, fake_redis):
+    """Cached doctor reads skip the database until the doctor is updated."""
+    from flask_jwt_extended import create_access_token
+    from api import metrics
+    from models.doctor import Doctor
+
+    doctor = Doctor(
+        full_name="Dr Who", email="who@example.com", password="x", specialization="GP"
+    )
+    db.session.add(doctor)
+    db.session.commit()
+    doctor_id = doctor.id
+    token = create_access_token(identity=doctor_id, additional_claims={"role": "doctor"})
+    headers = {"Authorization": f"Bearer {token}"}
+    search = {"specialization": "gp"}
+    metrics.reset()
+
+    first = client.get(f"/api/doctor/{doctor_id}", headers=headers)
+    found = client.post("/api/doctors/search", json=search, headers=headers)
+    assert first.status_code == 200 and found.status_code == 200
+    with metrics.count_queries(db.engine) as queries:
+        again = client.get(f"/api/doctor/{doctor_id}", headers=headers)
+        conditional = dict(headers, **{"If-None-Match": first.headers["ETag"]})
+        unchanged = client.get(f"/api/doctor/{doctor_id}", headers=conditional)
+        found_again = client.post("/api/doctors/search", json=search, headers=headers)
+    assert queries.count == 0
+    assert again.get_json() == first.get_json()
+    assert unchanged.status_code == 304
+    assert found_again.get_json() == found.get_json()
+    counters = metrics.snapshot()["counters"]
+    assert counters["cache.doctor.misses"] == 2
+    assert counters["cache.doctor.hits"] == 3
+
+    updated = client.put(
+        f"/api/update_doctor/{doctor_id}",
+        json={"full_name": "Dr Strange", "specialization": "Surgeon"},
+        headers=headers,
+    )
+    assert updated.status_code == 200
+    fresh = client.get(f"/api/doctor/{doctor_id}", headers=conditional)
+    assert fresh.status_code == 200
+    assert fresh.get_json()["data"]["full_name"] == "Dr Strange"
+    gone = client.post("/api/doctors/search", json=search, headers=headers)
+    assert gone.status_code == 404
+
+
+def test_cache_expiry_counts_from_the_first_entry(client, fake_redis):
+    """The first variant sets the TTL; later ones leave it alone."""
+    from api.cache import ReadThroughCache
+
+    cache = ReadThroughCache(fake_redis, "test", "DOCTOR_CACHE_TTL")
+    key = cache.key("id", 1)
+
+    cache.store(key, "all", {"id": 1})
+    assert 0 < fake_redis.ttl(key) <= app.config["DOCTOR_CACHE_TTL"]
+    fake_redis.expire(key, 5)
+    cache.store(key, "name", {"name": "Dr Who"})
+    assert 0 < fake_redis.ttl(key) <= 5
+
+
+def test_dashboard_is_cached_until_a_write(client, fake_redis, monkeypatch):
+    """The dashboard is served from cache and dropped by the user's writes."""
+    from flask_jwt_extended import create_access_token
+    from api import metrics
+    from api.cache import USER_COUNT_KEY
+    from models.base_model import local_now
+    from models.medication import Medication
+    from models.user import User
+
+    monkeypatch.setitem(app.config, "DASHBOARD_UPCOMING_LIMIT", 2)
+    user = User(full_name="Jane", email="jane@example.com", password="x")
+    db.session.add(user)
+    db.session.flush()
+    start = datetime.now() + timedelta(days=1)
+    for hours in (3, 1, 2):
+        db.session.add(
+            Appointment(
+                user_id=user.id,
+                status="Upcoming",
+                start_time=start + timedelta(hours=hours),
+                end_time=start + timedelta(hours=hours + 1),
+            )
+        )
+    db.session.commit()
+    user_id = user.id
+    headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+    fake_redis.set(USER_COUNT_KEY, 42)
+
+    with metrics.count_queries(db.engine) as queries:
+        first = client.get("/api/dashboard", headers=headers)
+    # One aggregate for the counts and one for the upcoming list
+    assert queries.count == 2
+    data = first.get_json()["data"]
+    assert data["totalAppointments"] == 3
+    assert data["total_users"] == 42
+    upcoming = data["list_of_upcoming_appointments"]
+    assert [a["start_time"] for a in upcoming] == sorted(
+        a["start_time"] for a in upcoming
+    )
+    assert len(upcoming) == 2
+
+    with metrics.count_queries(db.engine) as queries:
+        again = client.get("/api/dashboard", headers=headers)
+    assert queries.count == 0
+    assert again.get_json() == first.get_json()
+
+    db.session.add(
+        Medication(user_id=user_id, name="Ibuprofen", duration=[], count=2, count_left=2)
+    )
+    db.session.commit()
+    changed = client.get("/api/dashboard", headers=headers).get_json()["data"]
+    assert changed["totalMedicationTracking"] == 1
+
+
+def test_blocklist_cache_sees_revocations_from_other_workers(client, fake_redis):
+    """Good jtis are answered locally until another process revokes them."""
+    import time
+    from api import metrics
+    from api.blocklist import TokenBlocklist, token_blocklist
+
+    # Another worker, sharing the Redis server but not the local cache
+    other = TokenBlocklist(fake_redis, app)
+    metrics.reset()
+    try:
+        assert token_blocklist.is_revoked("jti-1") is False
+        deadline = time.monotonic() + 5
+        while not token_blocklist._connected.is_set():
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        assert token_blocklist.is_revoked("jti-1") is False
+        assert token_blocklist.is_revoked("jti-1") is False
+        counters = metrics.snapshot()["counters"]
+        assert counters["jwt_blocklist.local_hits"] == 1
+        assert counters["jwt_blocklist.redis_lookups"] == 2
+
+        other.revoke("jti-1", 60)
+        while "jwt_blocklist.revocations_received" not in metrics.snapshot()["counters"]:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert token_blocklist.is_revoked("jti-1") is True
+        assert metrics.snapshot()["timings"]["jwt_blocklist.propagation"]["count"] == 1
+    finally:
+        other.close()
+
+
+def test_blocklist_ignores_malformed_revocations(client):
+    """Odd messages on the channel never take the listener thread down."""
+    from api import metrics
+    from api.blocklist import TokenBlocklist
+
+    blocklist = TokenBlocklist(None)
+    metrics.reset()
+    for data in ("not json", "[1, 2]", '"jti"', "{}", '{"jti": ["x"]}'):
+        blocklist._received(data)
+    blocklist._received('{"jti": "jti-1"}')
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["jwt_blocklist.revocations_received"] == 1
+    assert "jwt_blocklist.propagation" not in snapshot["timings"]
+
+
+def test_login_rehashes_password_when_cost_changes(client, monkeypatch):
+    """Passwords are checked in the pool and re-hashed at the new cost."""
+    from api import metrics
+    from api.passwords import password_hasher
+    from models.user import User
+
+    monkeypatch.setitem(app.config, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setitem(app.config, "BCRYPT_LOG_ROUNDS", 4)
+    metrics.reset()
+    try:
+        user = User(
+            full_name="Jane", email="jane@example.com", password="secret", is_verified=True
+        )
+        user.hash_password()
+        db.session.add(user)
+        db.session.commit()
+        assert user.password.startswith("$2b$04$")
+
+        credentials = {"email": "jane@example.com", "password": "secret"}
+        assert client.post("/api/login", json=credentials).status_code == 200
+        assert db.session.get(User, user.id).password.startswith("$2b$04$")
+
+        monkeypatch.setitem(app.config, "BCRYPT_LOG_ROUNDS", 5)
+        assert client.post("/api/login", json=credentials).status_code == 200
+        db.session.expire_all()
+        assert db.session.get(User, user.id).password.startswith("$2b$05$")
+        assert client.post("/api/login", json=credentials).status_code == 200
+        wrong = dict(credentials, password="wrong")
+        assert client.post("/api/login", json=wrong).status_code == 401
+        assert "passwords.inline" not in metrics.snapshot()["counters"]
+    finally:
+        password_hasher.shutdown()
+
+
+def test_password_pool_recovers_from_a_dead_child(client, monkeypatch):
+    """A hashing child killed mid-flight costs a pool restart, not the logins."""
+    import os
+    import signal
+    from api import metrics
+    from api.passwords import PasswordHasher
+
+    monkeypatch.setitem(app.config, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setitem(app.config, "BCRYPT_LOG_ROUNDS", 4)
+    monkeypatch.setitem(app.extensions, "password_hasher", None)
+    hasher = PasswordHasher(app)
+    metrics.reset()
+    try:
+        hashed = hasher.hash("secret")
+        for process in list(hasher._executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+
+        assert hasher.check("secret", hashed)
+        assert metrics.snapshot()["counters"]["passwords.pool_restarts"] == 1
+    finally:
+        hasher.shutdown()
+
+
+# Tables that grow with the user base; hot queries must never scan them whole
+GROWING_TABLES = (
+    "appointments",
+    "doctors",
+    "medical_records",
+    "medications",
+    "email_outbox",
+)
+
+
+def full_scans(statement, parameters):
+    """The plan steps of `statement` that read a growing table in full."""
+    import re
+
+    connection = db.session.connection()
+    if connection.dialect.name == "postgresql":
+        # Tiny test tables make any plan cheap, so only ask what is possible
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = connection.exec_driver_sql("EXPLAIN " + statement, parameters)
+        pattern = r"Seq Scan on (%s)\b" % "|".join(GROWING_TABLES)
+        return [row[0] for row in plan if re.search(pattern, row[0])]
+    plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    pattern = r"^SCAN (%s)\b" % "|".join(GROWING_TABLES)
+    return [row[-1] for row in plan if re.match(pattern, row[-1])]
+
+
+def test_hot_queries_use_indexes(client, fake_redis):
+    """No per-user listing or scheduler sweep scans a growing table."""
+    from sqlalchemy import event
+    from flask_jwt_extended import create_access_token
+    from api.app import check_appointments, check_medications, drain_email_outbox
+    from models.medical_records import MedicalRecords
+    from models.medication import Medication
+    from models.user import User
+
+    create_appointment_batch(2)
+    user = User.query.first()
+    user_id = user.id
+    db.session.add(
+        MedicalRecords(
+            user_id=user_id,
+            record_name="Blood panel",
+            health_care_provider="Clinic",
+            type_of_record="Lab result",
+        )
+    )
+    db.session.add(
+        Medication(user_id=user_id, name="Ibuprofen", duration=[], count=2, count_left=2)
+    )
+    db.session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        client.get(f"/api/user_records/{user_id}", headers=headers)
+        client.post(f"/api/get_appointments/{user_id}", json={}, headers=headers)
+        client.get(f"/api/medications/{user_id}", headers=headers)
+        client.post(
+            f"/api/user_records/{user_id}", json={"search": "panel"}, headers=headers
+        )
+        client.post("/api/get-medications", json={"search": "ibu"}, headers=headers)
+        client.post("/api/doctors/search", json={"q": "dr w"}, headers=headers)
+        client.get("/api/dashboard", headers=headers)
+        check_appointments()
+        check_medications()
+        drain_email_outbox()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+
+    scans = {
+        statement: steps
+        for statement, parameters in statements
+        for steps in [full_scans(statement, parameters)]
+        if steps
+    }
+    assert statements
+    assert scans == {}
+
+
+def test_search_ranks_records_and_medications(client, fake_redis):
+    """Search matches substrings case-insensitively, best match first."""
+    from flask_jwt_extended import create_access_token
+    from models.medical_records import MedicalRecords
+    from models.medication import Medication
+    from models.user import User
+
+    user = User(full_name="Jane", email="jane@example.com", password="x")
+    db.session.add(user)
+    db.session.flush()
+    for name, diagnosis in [
+        ("Checkup", "Mild asthma"),
+        ("Blood panel", None),
+        ("Asthma review", "Asthma, well controlled"),
+    ]:
+        db.session.add(
+            MedicalRecords(
+                user_id=user.id,
+                record_name=name,
+                diagnosis=diagnosis,
+                health_care_provider="Clinic",
+                type_of_record="Visit",
+            )
+        )
+    for name in ("Salbutamol inhaler", "Ibuprofen"):
+        db.session.add(
+            Medication(user_id=user.id, name=name, duration=[], count=1, count_left=1)
+        )
+    db.session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+
+    found = client.post(
+        f"/api/user_records/{user.id}", json={"search": "ASTHM"}, headers=headers
+    ).get_json()
+    assert [r["record_name"] for r in found["data"]] == ["Asthma review", "Checkup"]
+    assert found["next_cursor"] is None
+
+    # Edits are searchable right away
+    checkup = MedicalRecords.query.filter_by(record_name="Checkup").one()
+    checkup.diagnosis = "Hay fever"
+    db.session.commit()
+    found = client.post(
+        f"/api/user_records/{user.id}", json={"search": "asthma"}, headers=headers
+    ).get_json()
+    assert [r["record_name"] for r in found["data"]] == ["Asthma review"]
+
+    found = client.post(
+        "/api/get-medications", json={"search": "inhal"}, headers=headers
+    ).get_json()
+    assert [m["name"] for m in found["data"]] == ["Salbutamol inhaler"]
+    # Too short for the trigram index, served by ilike instead
+    found = client.post(
+        "/api/get-medications", json={"search": "ib"}, headers=headers
+    ).get_json()
+    assert [m["name"] for m in found["data"]] == ["Ibuprofen"]
+
+
+def test_search_rebuild_repairs_renumbered_rows(client, fake_redis):
+    """`flask search rebuild` reindexes rows whose rowid moved under the index."""
+    from api.search import ranked_search
+    from models.medication import Medication
+    from models.user import User
+
+    user = User(full_name="Jane", email="jane@example.com", password="x")
+    db.session.add(user)
+    db.session.flush()
+    for name in ("Salbutamol inhaler", "Ibuprofen"):
+        db.session.add(
+            Medication(user_id=user.id, name=name, duration=[], count=1, count_left=1)
+        )
+    db.session.commit()
+
+    def found(terms):
+        query = ranked_search(Medication.query, Medication, terms)
+        return [medication.name for medication in query]
+
+    # What a dump restore does: the same rows come back under other rowids
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql("DROP TRIGGER medications_fts_update")
+        connection.exec_driver_sql("UPDATE medications SET rowid = rowid + 100")
+    assert found("inhal") == []
+
+    result = app.test_cli_runner().invoke(args=["search", "rebuild"])
+    assert result.exit_code == 0, result.output
+    assert found("inhal") == ["Salbutamol inhaler"]
+    assert found("profen") == ["Ibuprofen"]
+
+
+def test_search_ddl_matches_the_migrations(tmp_path):
+    """The create_all listeners build the same SQLite indexes as the migrations."""
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+    from sqlalchemy import create_engine
+    from api.search import SEARCH_COLUMNS
+    from migrations.text_search import create_search_indexes
+
+    def search_schema(engine):
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql(
+                "SELECT type, name, sql FROM sqlite_master "
+                "WHERE type = 'trigger' OR sql LIKE 'CREATE VIRTUAL TABLE%' "
+                "ORDER BY name"
+            )
+            return [tuple(row) for row in rows]
+
+    created = create_engine(f"sqlite:///{tmp_path / 'created.db'}")
+    db.metadata.create_all(created)
+
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    tables = [model.__table__ for model in SEARCH_COLUMNS]
+    with migrated.begin() as connection:
+        db.metadata.create_all(connection)
+        for table in tables:
+            for trigger in ("insert", "delete", "update"):
+                connection.exec_driver_sql(f"DROP TRIGGER {table.name}_fts_{trigger}")
+            connection.exec_driver_sql(f"DROP TABLE {table.name}_fts")
+        with Operations.context(MigrationContext.configure(connection)):
+            create_search_indexes(
+                {
+                    model.__tablename__: columns
+                    for model, columns in SEARCH_COLUMNS.items()
+                }
+            )
+
+    assert search_schema(created) == search_schema(migrated)
+    assert len(search_schema(created)) == 4 * len(SEARCH_COLUMNS)
+
+
+def test_doctor_search_is_ranked_with_facets(client, fake_redis):
+    """Doctor search matches through the index and counts facets over all matches."""
+    from flask_jwt_extended import create_access_token
+    from models.doctor import Doctor
+
+    for index, (name, specialization, years) in enumerate(
+        [
+            ("Ada Okafor", "Cardiology", 12),
+            ("Adaeze Bello", "Cardiology", 3),
+            ("Tunde Adams", "Dermatology", 25),
+            ("Musa Bala", "Dermatology", 7),
+        ]
+    ):
+        db.session.add(
+            Doctor(
+                full_name=name,
+                specialization=specialization,
+                years_of_experience=years,
+                email=f"doctor{index}@example.com",
+                password="x",
+            )
+        )
+    db.session.commit()
+    token = create_access_token(identity="someone", additional_claims={"role": "doctor"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    found = client.post(
+        "/api/doctors/search", json={"q": "ada", "limit": 2}, headers=headers
+    ).get_json()
+    assert len(found["data"]) == 2
+    # The facets cover every match, not just the page
+    assert found["facets"] == {
+        "specialization": {"Cardiology": 2, "Dermatology": 1},
+        "years_of_experience": {"10-19": 1, "0-4": 1, "20+": 1},
+    }
+
+    found = client.post(
+        "/api/doctors/search",
+        json={"full_name": "ada", "specialization": "cardio"},
+        headers=headers,
+    ).get_json()
+    assert {d["full_name"] for d in found["data"]} == {"Ada Okafor", "Adaeze Bello"}
+
+    # Profile edits are searchable right away
+    musa = Doctor.query.filter_by(full_name="Musa Bala").one()
+    token = create_access_token(identity=musa.id, additional_claims={"role": "doctor"})
+    client.put(
+        f"/api/update_doctor/{musa.id}",
+        json={"specialization": "Cardiology"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    found = client.post(
+        "/api/doctors/search", json={"specialization": "cardio"}, headers=headers
+    ).get_json()
+    assert found["facets"]["specialization"] == {"Cardiology": 3}
+    assert found["facets"]["years_of_experience"] == {"10-19": 1, "0-4": 1, "5-9": 1}
+
+
+def test_engine_options_and_pool_metrics(tmp_path):
+    """Pool settings come from config and the pool reports waits and saturation."""
+    from sqlalchemy import create_engine, exc
+    from api import metrics
+    from api.engine import MonitoredQueuePool, engine_options
+
+    config = dict(
+        app.config,
+        SQLALCHEMY_DATABASE_URI="postgresql://vault@db/vault",
+        DB_POOL_SIZE=3,
+        DB_MAX_OVERFLOW=1,
+    )
+    options = engine_options(config)
+    assert options["poolclass"] is MonitoredQueuePool
+    assert (options["pool_size"], options["max_overflow"]) == (3, 1)
+    assert options["pool_pre_ping"] is True
+    # SQLite keeps the pool Flask-SQLAlchemy chooses for it
+    sqlite = engine_options(dict(config, SQLALCHEMY_DATABASE_URI="sqlite://"))
+    assert "poolclass" not in sqlite and "pool_size" not in sqlite
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=MonitoredQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    metrics.reset()
+    held = engine.connect()
+    assert metrics.snapshot()["gauges"]["db.pool.saturation"] == 1.0
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    held.close()
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["db.pool.timeouts"] == 1
+    assert snapshot["timings"]["db.pool.checkout_wait"]["max"] >= 0.05
+    assert snapshot["gauges"]["db.pool.saturation"] == 0.0
+    engine.dispose()
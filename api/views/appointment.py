@@ -2,7 +2,11 @@ from flask import jsonify, request
 from datetime import datetime
 from api import db
 from models.appointment import Appointment
+from models.doctor import Doctor
 from models.user import User
+from api.conditional import not_modified
+from api.pagination import paginate
+from api.serializers import request_serializer
 from . import app_views
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
@@ -17,10 +21,11 @@ def error_response(status, code, message, status_code=400):
     )
 
 
-def success_response(message, data=None, status_code=200):
+def success_response(message, data=None, status_code=200, **extra):
     response = {"status": True, "statusCode": status_code, "msg": message}
     if data:
         response["data"] = data
+    response.update(extra)
     return jsonify(response), status_code
 
 
@@ -35,16 +40,33 @@ def get_appointments(user_id):
         data = request.get_json()
     except Exception:
         data = {}
+    serializer = request_serializer(Appointment, data)
+
+    # The payload includes each appointment's doctor, so doctor edits count too
+    unchanged = not_modified(
+        (
+            Appointment.query.filter_by(user_id=user_id).outerjoin(Appointment.doctor),
+            Appointment.updated_at,
+            Doctor.updated_at,
+        )
+    )
+    if unchanged:
+        return unchanged
+
     appointment_id = data.get("id")
     if appointment_id:
-        appointment = Appointment.query.get(appointment_id)
+        appointment = (
+            serializer.select(Appointment.query, Appointment.user_id)
+            .filter(Appointment.id == appointment_id)
+            .first()
+        )
         if not appointment or appointment.user_id != user_id:
             return error_response(
                 "ERROR", "APPOINTMENT_NOT_FOUND", "Appointment not found.", 404
             )
 
         return success_response(
-            "Appointment retrieved successfully.", appointment.to_dict()
+            "Appointment retrieved successfully.", serializer(appointment)
         )
 
     query = Appointment.query.filter_by(user_id=user_id)
@@ -84,7 +106,12 @@ def get_appointments(user_id):
                 "ERROR", "INVALID_STATUS", "Invalid status provided.", 400
             )
 
-    appointments = query.all()
+    # The doctor, when asked for, is read in the same query by an outer join
+    appointments, next_cursor = paginate(
+        serializer.select(query, Appointment.start_time),
+        Appointment.start_time,
+        params=data,
+    )
     if not appointments:
         return error_response(
             "ERROR", "NO_APPOINTMENTS_FOUND", "No appointments found.", 404
@@ -92,7 +119,8 @@ def get_appointments(user_id):
 
     return success_response(
         "Appointments retrieved successfully.",
-        [appointment.to_dict() for appointment in appointments],
+        [serializer(appointment) for appointment in appointments],
+        next_cursor=next_cursor,
     )
 
 
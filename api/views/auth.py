@@ -13,6 +13,7 @@ import jwt
 from datetime import datetime, timedelta
 from jwt import ExpiredSignatureError, InvalidTokenError
 from api.config import Config
+from api.notifications import email_dispatcher
 
 
 @app_views.route("/signup", methods=["POST"], strict_slashes=False)
@@ -68,6 +69,9 @@ def signup():
         )
         new_user.hash_password()
 
+        db.session.add(new_user)
+        db.session.commit()
+
         send_verification_email(
             new_user,
             subject="Email Verification",
@@ -76,9 +80,6 @@ def signup():
             action_text="Verify Your Account",
         )
 
-        db.session.add(new_user)
-        db.session.commit()
-
         return (
             jsonify(
                 {
@@ -127,6 +128,9 @@ def login():
         )
 
     if user and user.check_password(password):
+        if user.rehash_password(password):
+            # BCRYPT_LOG_ROUNDS changed since the hash was stored
+            db.session.commit()
         access_token = create_access_token(
             identity=user.id, additional_claims={"role": user.role}
         )
@@ -174,9 +178,7 @@ def send_verification_email(user, subject, body, footer, action_text):
     verification_link = (
         f"https://myhealthvault-backend.onrender.com/api/verify-email/{token}"
     )
-    from api.app import send_email
-
-    send_email(
+    email_dispatcher.enqueue(
         to=user.email,
         name=user.full_name,
         subject=subject,
@@ -391,9 +393,7 @@ def forgot_password():
     reset_link = (
         f"https://myhealthvault-backend.onrender.com/api/reset-password/{token}"
     )
-    from api.notifications import send_email
-
-    send_email(
+    email_dispatcher.enqueue(
         to=user.email,
         name=user.full_name,
         subject="Rest Your password",
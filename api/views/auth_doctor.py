@@ -10,6 +10,8 @@ import jwt
 from datetime import datetime, timedelta
 from jwt import ExpiredSignatureError, InvalidTokenError
 from api.config import Config
+from api.cache import forget_doctor
+from api.notifications import email_dispatcher
 
 
 @app_views.route("/doctor/signup", methods=["POST"], strict_slashes=False)
@@ -61,6 +63,11 @@ def doctor_signup():
         )
         new_doctor.hash_password()
 
+        db.session.add(new_doctor)
+        db.session.commit()
+        # New doctors show up in the directory right away
+        forget_doctor()
+
         send_verification_email(
             new_doctor,
             subject="Email Verification",
@@ -68,9 +75,6 @@ def doctor_signup():
             action_text="Verify Account",
         )
 
-        db.session.add(new_doctor)
-        db.session.commit()
-
         return (
             jsonify(
                 {
@@ -119,6 +123,9 @@ def doctor_login():
         )
 
     if doctor and doctor.check_password(password):
+        if doctor.rehash_password(password):
+            # BCRYPT_LOG_ROUNDS changed since the hash was stored
+            db.session.commit()
         access_token = create_access_token(
             identity=doctor.id, additional_claims={"role": "doctor"}
         )
@@ -163,9 +170,7 @@ def send_verification_email(doctor, subject, body, action_text):
     verification_link = (
         f"https://myhealthvault-backend.onrender.com/api/doctor/verify-email/{token}"
     )
-    from api.app import send_email
-
-    send_email(
+    email_dispatcher.enqueue(
         to=doctor.email,
         name=doctor.full_name,
         subject=subject,
@@ -198,6 +203,7 @@ def doctor_verify_email(token):
 
         doctor.is_verified = True
         db.session.commit()
+        forget_doctor(doctor)
 
         return redirect("https://myhealthvault.netlify.app/auth/login", code=302)
 
@@ -1,39 +1,89 @@
-from flask import jsonify
+from flask import current_app, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.medical_records import MedicalRecords
 from models.appointment import Appointment
-from models.user import User
 from models.medication import Medication
 from datetime import datetime
+from sqlalchemy.orm import joinedload
+from api.cache import dashboard_cache, dashboard_key, total_users
+from api.conditional import Version, aggregate, not_modified_since, version_for
+from models.doctor import Doctor
 from . import app_views
 
 
+def load_dashboard(user_id):
+    """The per-user part of the dashboard, in two statements."""
+    current_time = datetime.now()
+    upcoming = Appointment.query.filter(
+        Appointment.user_id == user_id,
+        Appointment.start_time >= current_time,
+    )
+
+    # Every count, and the version of what the dashboard shows, in one statement
+    values = aggregate(
+        (
+            MedicalRecords.query.filter_by(user_id=user_id),
+            MedicalRecords.updated_at,
+        ),
+        (
+            Appointment.query.filter_by(user_id=user_id).outerjoin(Appointment.doctor),
+            Appointment.updated_at,
+            Doctor.updated_at,
+        ),
+        # Appointments leave the upcoming list as time passes
+        (upcoming,),
+        (
+            Medication.query.filter_by(user_id=user_id),
+            Medication.updated_at,
+        ),
+    )
+    total_medical_records, _, total_appointments, _, _, _, total_medication, _ = values
+
+    list_of_upcoming_appointments = (
+        upcoming.options(joinedload(Appointment.doctor))
+        .order_by(Appointment.start_time, Appointment.id)
+        .limit(current_app.config["DASHBOARD_UPCOMING_LIMIT"])
+        .all()
+    )
+
+    return {
+        "version": version_for(values).dump(),
+        "totalMedicalRecords": total_medical_records,
+        "totalAppointments": total_appointments,
+        "totalMedicationTracking": total_medication,
+        "list_of_upcoming_appointments": [
+            appointment.to_dict() for appointment in list_of_upcoming_appointments
+        ],
+    }
+
+
 @app_views.route("/dashboard", methods=["GET"], strict_slashes=False)
 @jwt_required()
 def dashboard():
     try:
         current_user_id = get_jwt_identity()
+        key = dashboard_key(current_user_id)
 
-        total_medical_records = MedicalRecords.query.filter_by(
-            user_id=current_user_id
-        ).count()
-        total_appointments = Appointment.query.filter_by(
-            user_id=current_user_id
-        ).count()
-        total_medication_tracking = Medication.query.filter_by(
-            user_id=current_user_id
-        ).count()
-        total_users = User.query.count()
+        data = dashboard_cache.get(key, "data", lambda: load_dashboard(current_user_id))
+        upcoming = data["list_of_upcoming_appointments"]
+        if (
+            upcoming
+            and datetime.fromisoformat(upcoming[0]["start_time"]) < datetime.now()
+        ):
+            # The first upcoming appointment has started since this was cached
+            dashboard_cache.invalidate(key)
+            data = dashboard_cache.get(
+                key, "data", lambda: load_dashboard(current_user_id)
+            )
 
-        current_time = datetime.now()
-        list_of_upcoming_appointments = Appointment.query.filter(
-            Appointment.user_id == current_user_id,
-            Appointment.start_time >= current_time,
-        ).all()
-
-        upcoming_appointments = [
-            appointment.to_dict() for appointment in list_of_upcoming_appointments
-        ]
+        # Writes to records, appointments or medications drop the cached copy,
+        # so its version is current and a 304 costs no query
+        state, last_modified = data.pop("version")
+        data["total_users"] = total_users()
+        version = Version.restore([f"{state}:{data['total_users']}", last_modified])
+        unchanged = not_modified_since(version)
+        if unchanged:
+            return unchanged
 
         return (
             jsonify(
@@ -41,13 +91,7 @@ def dashboard():
                     "status": True,
                     "statusCode": 200,
                     "msg": f"Dashboard succesfully retreived",
-                    "data": {
-                        "totalMedicalRecords": total_medical_records,
-                        "totalAppointments": total_appointments,
-                        "totalMedicationTracking": total_medication_tracking,
-                        "list_of_upcoming_appointments": upcoming_appointments,
-                        "total_users": total_users,
-                    },
+                    "data": data,
                 }
             ),
             200,
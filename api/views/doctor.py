@@ -1,8 +1,26 @@
 from . import app_views
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from api import db
 from models.doctor import Doctor
+from api.cache import (
+    DOCTOR_LISTS_KEY,
+    doctor_cache,
+    doctor_email_key,
+    doctor_key,
+    forget_doctor,
+)
+from api.conditional import Version, not_modified_since, version_of
+from api.pagination import InvalidCursor, page_size, paginate
+from api.search import ranked_search
+from api.serializers import InvalidFields, requested_fields, serializer_for
+from sqlalchemy import case, func
+
+
+def cache_variant(fields, **params):
+    """The cache field for a response narrowed to `fields` and `params`."""
+    params["fields"] = fields
+    return current_app.json.dumps(params, sort_keys=True, separators=(",", ":"))
 
 
 @app_views.route("/doctor/<id>", methods=["GET", "POST"], strict_slashes=False)
@@ -15,14 +33,17 @@ def get_doctor(id=None):
         data = request.get_json(silent=True) or {}
         email = data.get("email")
         doctor_id = data.get("id")
+        fields = requested_fields(Doctor, data)
+        serializer = serializer_for(Doctor, fields)
+        query = Doctor.query
 
         # Determine doctor retrieval criteria
-        if id:
-            doctor = Doctor.query.get(id)
-        elif doctor_id:
-            doctor = Doctor.query.get(doctor_id)
+        if id or doctor_id:
+            query = query.filter(Doctor.id == (id or doctor_id))
+            key = doctor_key(id or doctor_id)
         elif email:
-            doctor = Doctor.query.filter_by(email=email).first()
+            query = query.filter(Doctor.email == email)
+            key = doctor_email_key(email)
         else:
             return (
                 jsonify(
@@ -36,10 +57,22 @@ def get_doctor(id=None):
                 400,
             )
 
+        def load():
+            version = version_of((query, Doctor.updated_at))
+            doctor = serializer.select(query).first()
+            if doctor is None:
+                return None
+            return {"version": version.dump(), "data": serializer(doctor)}
+
         # Return doctor data if found
-        if doctor:
+        cached = doctor_cache.get(key, cache_variant(fields), load)
+        if cached:
+            # The version is cached with the profile, so a 304 costs no query
+            unchanged = not_modified_since(Version.restore(cached["version"]))
+            if unchanged:
+                return unchanged
             return (
-                jsonify({"status": True, "statusCode": 200, "data": doctor.to_dict()}),
+                jsonify({"status": True, "statusCode": 200, "data": cached["data"]}),
                 200,
             )
         else:
@@ -54,6 +87,8 @@ def get_doctor(id=None):
                 ),
                 404,
             )
+    except InvalidFields:
+        raise
     except Exception as e:
         return (
             jsonify(
@@ -126,6 +161,7 @@ def update_doctor(doctor_id):
         doctor.bio = data.get("bio", doctor.bio)
 
         db.session.commit()
+        forget_doctor(doctor)
         return (
             jsonify(
                 {
@@ -187,6 +223,7 @@ def delete_doctor(doctor_id):
     try:
         db.session.delete(doctor)
         db.session.commit()
+        forget_doctor(doctor)
         return (
             jsonify(
                 {
@@ -216,24 +253,42 @@ def delete_doctor(doctor_id):
 @jwt_required()
 def get_all_doctors():
     try:
-        # Query all doctors in the database
-        doctors = Doctor.query.all()
+        fields = requested_fields(Doctor)
+        serializer = serializer_for(Doctor, fields)
 
-        # Convert each doctor to a dictionary
-        doctors_data = [doctor.to_dict() for doctor in doctors]
+        def load():
+            # Query one page of doctors, only the columns the payload needs
+            doctors, next_cursor = paginate(
+                serializer.select(Doctor.query, Doctor.created_at), Doctor.created_at
+            )
+            # Convert each doctor row to a dictionary
+            return {
+                "data": [serializer(doctor) for doctor in doctors],
+                "next_cursor": next_cursor,
+            }
+
+        variant = cache_variant(
+            fields,
+            cursor=request.args.get("cursor"),
+            limit=page_size(request.args.get("limit")),
+        )
+        page = doctor_cache.get(DOCTOR_LISTS_KEY, variant, load)
 
         return (
             jsonify(
                 {
                     "status": True,
                     "statusCode": 200,
-                    "data": doctors_data,
+                    "data": page["data"],
+                    "next_cursor": page["next_cursor"],
                     "msg": "Doctors retrieved successfully.",
                 }
             ),
             200,
         )
 
+    except (InvalidCursor, InvalidFields):
+        raise
     except Exception as e:
         # Handle unexpected server errors
         return (
@@ -249,6 +304,58 @@ def get_all_doctors():
         )
 
 
+# The body keys search_doctors filters on; "q" matches any text column
+SEARCH_CRITERIA = (
+    "q",
+    "full_name",
+    "specialization",
+    "years_of_experience",
+    "address",
+    "phone_number",
+    "email",
+)
+# The criteria matched as substrings of the column of the same name
+TEXT_CRITERIA = ("full_name", "specialization", "address", "email")
+
+# Facet buckets of years_of_experience, by their lower bound
+EXPERIENCE_BUCKETS = ((20, "20+"), (10, "10-19"), (5, "5-9"), (0, "0-4"))
+
+
+def doctor_facets(query):
+    """
+    Count the doctors `query` matches by specialization and by bucket of
+    years of experience, in one grouped statement.
+
+    This runs next to the page query rather than inside it. Window counts
+    only ride on the rows a statement returns, so the page's `limit` would
+    drop the buckets of every doctor past it. Both statements run only on
+    a miss of the doctor list cache.
+    """
+    bucket = case(
+        *[
+            (Doctor.years_of_experience >= low, label)
+            for low, label in EXPERIENCE_BUCKETS
+        ],
+        else_="unknown",
+    )
+    rows = (
+        query.order_by(None)
+        .with_entities(Doctor.specialization, bucket, func.count())
+        .group_by(Doctor.specialization, bucket)
+        .all()
+    )
+    facets = {"specialization": {}, "years_of_experience": {}}
+    for specialization, years, count in rows:
+        specialization = specialization or "unknown"
+        by_specialization = facets["specialization"]
+        by_specialization[specialization] = (
+            by_specialization.get(specialization, 0) + count
+        )
+        by_years = facets["years_of_experience"]
+        by_years[years] = by_years.get(years, 0) + count
+    return facets
+
+
 @app_views.route("/doctors/search", methods=["POST"], strict_slashes=False)
 @jwt_required()
 def search_doctors():
@@ -256,36 +363,44 @@ def search_doctors():
         data = request.get_json(silent=True) or {}
 
         limit = data.get("limit")
-
-        query = Doctor.query
-
-        if "full_name" in data:
-            query = query.filter(Doctor.full_name.ilike(f"%{data['full_name']}%"))
-
-        if "specialization" in data:
-            query = query.filter(
-                Doctor.specialization.ilike(f"%{data['specialization']}%")
-            )
-
-        if "years_of_experience" in data:
-            query = query.filter(
-                Doctor.years_of_experience >= data["years_of_experience"]
-            )
-
-        if "address" in data:
-            query = query.filter(Doctor.address.ilike(f"%{data['address']}%"))
-
-        if "phone_number" in data:
-            query = query.filter(Doctor.phone_number == data["phone_number"])
-
-        if "email" in data:
-            query = query.filter(Doctor.email.ilike(f"%{data['email']}%"))
-
-        if limit and isinstance(limit, int) and limit > 0:
-            doctors = query.limit(limit).all()
-        else:
-            doctors = query.all()
-        if not doctors:
+        if not (limit and isinstance(limit, int) and limit > 0):
+            limit = None
+        fields = requested_fields(Doctor, data)
+        serializer = serializer_for(Doctor, fields)
+        criteria = {name: data[name] for name in SEARCH_CRITERIA if name in data}
+
+        def load():
+            query = serializer.select(Doctor.query)
+
+            if "years_of_experience" in criteria:
+                query = query.filter(
+                    Doctor.years_of_experience >= criteria["years_of_experience"]
+                )
+
+            if "phone_number" in criteria:
+                query = query.filter(Doctor.phone_number == criteria["phone_number"])
+
+            # Text criteria go through the search index, best match first
+            terms = {
+                name: str(criteria[name])
+                for name in TEXT_CRITERIA
+                if criteria.get(name) not in (None, "")
+            }
+            if criteria.get("q"):
+                terms[None] = str(criteria["q"])
+            if terms:
+                query = ranked_search(query, Doctor, terms)
+
+            doctors = query.limit(limit) if limit else query
+            return {
+                "data": [serializer(doctor) for doctor in doctors],
+                "facets": doctor_facets(query),
+            }
+
+        variant = cache_variant(fields, search=criteria, limit=limit, facets=True)
+        result = doctor_cache.get(DOCTOR_LISTS_KEY, variant, load)
+        doctors_data = result["data"]
+        if not doctors_data:
             return (
                 jsonify(
                     {
@@ -297,7 +412,6 @@ def search_doctors():
                 ),
                 404,
             )
-        doctors_data = [doctor.to_dict() for doctor in doctors]
 
         return (
             jsonify(
@@ -305,12 +419,15 @@ def search_doctors():
                     "status": True,
                     "statusCode": 200,
                     "data": doctors_data,
+                    "facets": result["facets"],
                     "msg": "Doctors retrieved successfully.",
                 }
             ),
             200,
         )
 
+    except InvalidFields:
+        raise
     except Exception as e:
         # Handle unexpected server errors
         return (
@@ -1,6 +1,8 @@
 from flask import jsonify, request
 from api import db
 from models.extra import Inquiry, Subscriber
+from api.pagination import paginate
+from api.streaming import stream_list, wants_stream
 from . import app_views
 
 
@@ -62,15 +64,33 @@ def subscribe():
         )
 
 
+def subscriber_to_dict(s):
+    return {"id": s.id, "email": s.email, "subscribed_at": s.created_at}
+
+
 @app_views.route("/subscribers", methods=["GET"], strict_slashes=False)
 def list_subscribers():
     """Endpoint to list all subscribers"""
-    subscribers = Subscriber.query.all()
-    subscriber_list = [
-        {"id": s.id, "email": s.email, "subscribed_at": s.created_at}
-        for s in subscribers
-    ]
-    return jsonify({"statusCode": 201, "status": True, "data": subscriber_list}), 200
+    if wants_stream():
+        return stream_list(
+            Subscriber.query.order_by(Subscriber.created_at, Subscriber.id),
+            subscriber_to_dict,
+            {"statusCode": 201, "status": True},
+        )
+
+    subscribers, next_cursor = paginate(Subscriber.query, Subscriber.created_at)
+    subscriber_list = [subscriber_to_dict(s) for s in subscribers]
+    return (
+        jsonify(
+            {
+                "statusCode": 201,
+                "status": True,
+                "data": subscriber_list,
+                "next_cursor": next_cursor,
+            }
+        ),
+        200,
+    )
 
 
 @app_views.route("/inquiry", methods=["POST"], strict_slashes=False)
@@ -110,21 +130,33 @@ def submit_inquiry():
     )
 
 
+def inquiry_to_dict(inquiry):
+    return {
+        "id": inquiry.id,
+        "name": inquiry.name,
+        "email": inquiry.email,
+        "message": inquiry.message,
+        "submitted_at": inquiry.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
 # Fetch All Inquiries Endpoint
 @app_views.route("/inquiries", methods=["GET"], strict_slashes=False)
 def get_all_inquiries():
     """Endpoint to retrieve all submitted inquiries"""
-    inquiries = Inquiry.query.all()
-    inquiries_list = [
-        {
-            "id": inquiry.id,
-            "name": inquiry.name,
-            "email": inquiry.email,
-            "message": inquiry.message,
-            "submitted_at": inquiry.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-        }
-        for inquiry in inquiries
-    ]
+    if wants_stream():
+        return stream_list(
+            Inquiry.query.order_by(Inquiry.created_at, Inquiry.id),
+            inquiry_to_dict,
+            {
+                "statusCode": 200,
+                "status": True,
+                "msg": "Inquiries retrieved successfully",
+            },
+        )
+
+    inquiries, next_cursor = paginate(Inquiry.query, Inquiry.created_at)
+    inquiries_list = [inquiry_to_dict(inquiry) for inquiry in inquiries]
 
     return (
         jsonify(
@@ -133,6 +165,7 @@ def get_all_inquiries():
                 "status": True,
                 "msg": "Inquiries retrieved successfully",
                 "data": inquiries_list,
+                "next_cursor": next_cursor,
             }
         ),
         200,
@@ -3,7 +3,10 @@ from flask import jsonify, request
 from api import db
 from models.user import User
 from models.medical_records import MedicalRecords
-from sqlalchemy import asc, desc
+from api.conditional import not_modified
+from api.pagination import InvalidCursor, page_size, paginate
+from api.search import ranked_search
+from api.serializers import InvalidFields, request_serializer
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from api.views.routes import (
     upload_file,
@@ -15,6 +18,17 @@ from api.views.routes import (
 )
 from werkzeug.utils import secure_filename
 
+# Columns the record listing can be sorted by; they must not be nullable
+RECORD_SORT_KEYS = (
+    "last_added",
+    "last_updated",
+    "created_at",
+    "updated_at",
+    "record_name",
+    "type_of_record",
+    "health_care_provider",
+)
+
 
 @app_views.route("/create_record/<user_id>", methods=["POST"], strict_slashes=False)
 @jwt_required()
@@ -209,9 +223,27 @@ def get_user_medical_records(user_id):
         except Exception:
             data = None  # No JSON provided
 
-        # If JSON data is not present, return all records
+        serializer = request_serializer(MedicalRecords, data)
+
+        # Answer with a 304 if none of the records this request reads changed
+        if data and data.get("id"):
+            records_query = MedicalRecords.query.filter_by(id=data["id"])
+        else:
+            records_query = MedicalRecords.query.filter_by(user_id=user_id)
+        unchanged = not_modified((records_query, MedicalRecords.updated_at))
+        if unchanged:
+            return unchanged
+
+        # If JSON data is not present, return the latest records
         if data is None:
-            records = MedicalRecords.query.filter_by(user_id=user_id).all()
+            records, next_cursor = paginate(
+                serializer.select(
+                    MedicalRecords.query.filter_by(user_id=user_id),
+                    MedicalRecords.last_added,
+                ),
+                MedicalRecords.last_added,
+                descending=True,
+            )
             if not records:
                 return (
                     jsonify(
@@ -230,7 +262,8 @@ def get_user_medical_records(user_id):
                         "msg": "Medical Records successfully retrieved",
                         "status": True,
                         "statusCode": 200,
-                        "data": [record.to_dict() for record in records],
+                        "data": [serializer(record) for record in records],
+                        "next_cursor": next_cursor,
                     }
                 ),
                 200,
@@ -239,7 +272,11 @@ def get_user_medical_records(user_id):
         # Process the incoming JSON data
         id = data.get("id")
         if id:
-            record = MedicalRecords.query.filter_by(id=id).first()
+            record = (
+                serializer.select(MedicalRecords.query)
+                .filter(MedicalRecords.id == id)
+                .first()
+            )
             if not record:
                 return (
                     jsonify(
@@ -259,13 +296,12 @@ def get_user_medical_records(user_id):
                         "msg": "Medical Record successfully retrieved",
                         "status": True,
                         "statusCode": 200,
-                        "data": record.to_dict(),
+                        "data": serializer(record),
                     }
                 ),
                 200,
             )
 
-        limit = int(data.get("limit")) if data.get("limit") else None
         sort_by = data.get("sort_by", "last_added")
         sort_order = data.get("sort_order", "desc")
         record_name = data.get("record_name")
@@ -305,18 +341,28 @@ def get_user_medical_records(user_id):
         if updated_end:
             query = query.filter(MedicalRecords.updated_at <= updated_end)
 
-        # Sort the records by specified field and order
-        if sort_order == "asc":
-            query = query.order_by(asc(getattr(MedicalRecords, sort_by, "last_added")))
-        else:
-            query = query.order_by(desc(getattr(MedicalRecords, sort_by, "last_added")))
-
-        # Limit the number of results if specified
-        if limit:
-            query = query.limit(limit)
+        # Search mode: one page of the best matches, ranked
+        if data.get("search"):
+            records = (
+                ranked_search(
+                    serializer.select(query), MedicalRecords, str(data["search"])
+                )
+                .limit(page_size(data.get("limit")))
+                .all()
+            )
+            next_cursor = None
 
-        # Execute the query and fetch records
-        records = query.all()
+        # Otherwise fetch one page sorted by the specified field and order
+        else:
+            if sort_by not in RECORD_SORT_KEYS:
+                sort_by = "last_added"
+            sort_column = getattr(MedicalRecords, sort_by)
+            records, next_cursor = paginate(
+                serializer.select(query, sort_column),
+                sort_column,
+                descending=sort_order != "asc",
+                params=data,
+            )
 
         if not records:
             return (
@@ -337,11 +383,14 @@ def get_user_medical_records(user_id):
                     "msg": "Medical Records successfully retrieved",
                     "status": True,
                     "statusCode": 200,
-                    "data": [record.to_dict() for record in records],
+                    "data": [serializer(record) for record in records],
+                    "next_cursor": next_cursor,
                 }
             ),
             200,
         )
+    except (InvalidCursor, InvalidFields):
+        raise
     except Exception as e:
         return (
             jsonify(
@@ -4,6 +4,10 @@ from datetime import datetime
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from api import db
 from models.medication import Medication
+from api.conditional import not_modified
+from api.pagination import InvalidCursor, page_size, paginate
+from api.search import ranked_search
+from api.serializers import InvalidFields, request_serializer
 from . import app_views
 
 
@@ -17,10 +21,11 @@ def error_response(status, code, message, status_code=400):
     )
 
 
-def success_response(message, data=None, status_code=200):
+def success_response(message, data=None, status_code=200, **extra):
     response = {"status": True, "statusCode": status_code, "msg": message}
     if data:
         response["data"] = data
+    response.update(extra)
     return jsonify(response), status_code
 
 
@@ -174,8 +179,20 @@ def get_medications_by_user(user_id):
                 403,
             )
 
-        # Query all medications for the specified user_id
-        medications = Medication.query.filter_by(user_id=user_id).all()
+        unchanged = not_modified(
+            (Medication.query.filter_by(user_id=user_id), Medication.updated_at)
+        )
+        if unchanged:
+            return unchanged
+
+        # Query one page of medications for the specified user_id
+        serializer = request_serializer(Medication)
+        medications, next_cursor = paginate(
+            serializer.select(
+                Medication.query.filter_by(user_id=user_id), Medication.created_at
+            ),
+            Medication.created_at,
+        )
 
         if not medications:
             return error_response(
@@ -186,10 +203,16 @@ def get_medications_by_user(user_id):
             )
 
         # Convert medications to dictionary format
-        medications_data = [medication.to_dict() for medication in medications]
+        medications_data = [serializer(medication) for medication in medications]
 
-        return success_response("Medications retrieved successfully", medications_data)
+        return success_response(
+            "Medications retrieved successfully",
+            medications_data,
+            next_cursor=next_cursor,
+        )
 
+    except (InvalidCursor, InvalidFields):
+        raise
     except Exception as e:
         return error_response("ERROR", "INTERNAL_SERVER_ERROR", str(e), 500)
 
@@ -210,14 +233,20 @@ def get_medications():
             "updated_at": data.get("updated_at"),
             "count": data.get("count"),
             "count_left": data.get("count_left"),
+            "search": data.get("search"),
         }
 
         query = Medication.query.filter_by(user_id=user_id)
+        serializer = request_serializer(Medication, data)
+
+        unchanged = not_modified((query, Medication.updated_at))
+        if unchanged:
+            return unchanged
 
         if filters["id"]:
-            medication = Medication.query.filter_by(
-                user_id=user_id, id=filters["id"]
-            ).first()
+            medication = (
+                serializer.select(query).filter(Medication.id == filters["id"]).first()
+            )
             if not medication:
                 return error_response(
                     "ERROR",
@@ -226,7 +255,7 @@ def get_medications():
                     404,
                 )
             return success_response(
-                "Medication successfully retrieved", medication.to_dict()
+                "Medication successfully retrieved", serializer(medication)
             )
 
         # Apply filters to the query
@@ -265,7 +294,22 @@ def get_medications():
                     "Invalid format for updated_at. Use YYYY-MM-DD HH:MM:SS.",
                 )
 
-        medications = query.all()
+        if filters["search"]:
+            # Search mode: one page of the best matches, ranked
+            medications = (
+                ranked_search(
+                    serializer.select(query), Medication, str(filters["search"])
+                )
+                .limit(page_size(data.get("limit")))
+                .all()
+            )
+            next_cursor = None
+        else:
+            medications, next_cursor = paginate(
+                serializer.select(query, Medication.created_at),
+                Medication.created_at,
+                params=data,
+            )
 
         if not medications:
             return error_response(
@@ -273,9 +317,13 @@ def get_medications():
             )
 
         return success_response(
-            "Medications successfully retrieved", [med.to_dict() for med in medications]
+            "Medications successfully retrieved",
+            [serializer(med) for med in medications],
+            next_cursor=next_cursor,
         )
 
+    except (InvalidCursor, InvalidFields):
+        raise
     except Exception as e:
         return error_response("ERROR", "INTERNAL_SERVER_ERROR", str(e), 500)
 
@@ -3,6 +3,10 @@ from flask import request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from api import db
 from models.user import User
+from api.conditional import not_modified
+from api.pagination import InvalidCursor, paginate
+from api.serializers import InvalidFields, request_serializer
+from api.streaming import stream_list, wants_stream
 from PIL import Image
 
 from api.config import bucket
@@ -13,18 +17,31 @@ from api.views.routes import upload_file, allowed_file, IMAGE_EXTENSIONS
 @jwt_required()
 def all_users():
     try:
-        users = User.query.all()
-        user_dict = [user.to_dict() for user in users]
+        serializer = request_serializer(User)
+        if wants_stream():
+            return stream_list(
+                serializer.select(User.query.order_by(User.created_at, User.id)),
+                serializer,
+                {"status": True, "statusCode": 200},
+            )
+
+        users, next_cursor = paginate(
+            serializer.select(User.query, User.created_at), User.created_at
+        )
+        user_dict = [serializer(user) for user in users]
         return (
             jsonify(
                 {
                     "status": True,
                     "statusCode": 200,
                     "data": user_dict,
+                    "next_cursor": next_cursor,
                 }
             ),
             200,
         )
+    except (InvalidCursor, InvalidFields):
+        raise
     except Exception as e:
         return (
             jsonify(
@@ -51,12 +68,14 @@ def get_user(id=None):
             data = {}
         email = data.get("email")
         user_id = data.get("id")
+        serializer = request_serializer(User, data)
+        query = User.query
         if id:
-            user = User.query.get(id)
+            query = query.filter(User.id == id)
         elif user_id:
-            user = User.query.get(user_id)
+            query = query.filter(User.id == user_id)
         elif email:
-            user = User.query.filter_by(email=email).first()
+            query = query.filter(User.email == email)
         else:
             return (
                 jsonify(
@@ -70,13 +89,18 @@ def get_user(id=None):
                 400,
             )
 
+        unchanged = not_modified((query, User.updated_at))
+        if unchanged:
+            return unchanged
+
+        user = serializer.select(query).first()
         if user:
             return (
                 jsonify(
                     {
                         "status": True,
                         "statusCode": 200,
-                        "data": user.to_dict(),
+                        "data": serializer(user),
                     }
                 ),
                 200,
@@ -93,6 +117,8 @@ def get_user(id=None):
                 ),
                 404,
             )
+    except InvalidFields:
+        raise
     except Exception as e:
         return (
             jsonify(
@@ -0,0 +1,40 @@
+"""
+Standalone process for the scheduled appointment and medication jobs.
+
+Start it with ``python -m api.worker`` (or ``flask worker``) and set
+``SCHEDULER_ENABLED=false`` for the web processes, so web and worker capacity
+can be scaled independently.
+"""
+
+import os
+
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.schedulers.blocking import BlockingScheduler
+from colorama import Fore
+
+
+def run_worker():
+    """Run the scheduled jobs in the foreground until interrupted."""
+    from api.app import app, scheduler, register_jobs, log_message
+
+    if scheduler.running:
+        # This process is the worker; don't keep the in-web scheduler as well
+        scheduler.shutdown(wait=False)
+
+    worker = BlockingScheduler(
+        executors={
+            "default": ThreadPoolExecutor(max_workers=app.config["SCHEDULER_THREADS"])
+        }
+    )
+    register_jobs(worker)
+    log_message("Worker started, running scheduled jobs...", Fore.GREEN)
+    try:
+        worker.start()
+    except (KeyboardInterrupt, SystemExit):
+        log_message("Worker stopped.", Fore.YELLOW)
+
+
+if __name__ == "__main__":
+    # Importing api.app must not start the web scheduler in this process
+    os.environ["SCHEDULER_ENABLED"] = "false"
+    run_worker()
@@ -90,9 +90,18 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # the text search tables and indexes are not in the models' metadata,
+    # see api/search.py; keep autogenerate from dropping them
+    def include_object(object, name, type_, reflected, compare_to):
+        if reflected and compare_to is None and name:
+            return not ('_fts' in name or name.endswith('_trgm'))
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
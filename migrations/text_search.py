@@ -0,0 +1,57 @@
+"""Text search index DDL shared by revisions e9c4a7b3d215 and f1a8c6e2b749.
+
+This is a frozen copy: it must not import app code, and what it emits must
+not change, or replaying the revisions that use it would build different
+schemas. A revision that needs other DDL gets a new function here.
+
+On SQLite the FTS5 tables use the implicit rowid of their content table,
+whose TEXT primary keys do not pin it. Anything that renumbers rowids (a
+VACUUM, a restore from a dump) must be followed by `flask search rebuild`,
+see api/search.py.
+"""
+from alembic import op
+
+
+def create_search_indexes(search_columns):
+    """Index the columns of each table in `search_columns` for text search."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, columns in search_columns.items():
+            for column in columns:
+                op.create_index(
+                    f'ix_{table}_{column}_trgm', table, [column],
+                    postgresql_using='gin',
+                    postgresql_ops={column: 'gin_trgm_ops'},
+                )
+    elif dialect == 'sqlite':
+        for table, columns in search_columns.items():
+            fts = f'{table}_fts'
+            names = ', '.join(columns)
+            new = ', '.join(f'new.{column}' for column in columns)
+            old = ', '.join(f'old.{column}' for column in columns)
+            delete = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old});"
+            insert = f'INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new});'
+            op.execute(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, "
+                f"content='{table}', content_rowid='rowid', tokenize='trigram')"
+            )
+            op.execute(f'CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN {insert} END')
+            op.execute(f'CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN {delete} END')
+            op.execute(f'CREATE TRIGGER {fts}_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END')
+            op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_indexes(search_columns):
+    """Drop what `create_search_indexes(search_columns)` created."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table, columns in search_columns.items():
+            for column in columns:
+                op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
+    elif dialect == 'sqlite':
+        for table in search_columns:
+            fts = f'{table}_fts'
+            for trigger in ('insert', 'delete', 'update'):
+                op.execute(f'DROP TRIGGER {fts}_{trigger}')
+            op.execute(f'DROP TABLE {fts}')
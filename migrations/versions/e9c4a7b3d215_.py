@@ -0,0 +1,32 @@
+"""add text search indexes on records and medications
+
+Revision ID: e9c4a7b3d215
+Revises: e5b8d2a4f610
+Create Date: 2026-10-17 18:05:41.772913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.text_search import create_search_indexes, drop_search_indexes
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9c4a7b3d215'
+down_revision = 'e5b8d2a4f610'
+branch_labels = None
+depends_on = None
+
+# The tables and columns api/search.py searched at this revision
+SEARCH_COLUMNS = {
+    'medical_records': ('record_name', 'diagnosis'),
+    'medications': ('name',),
+}
+
+
+def upgrade():
+    create_search_indexes(SEARCH_COLUMNS)
+
+
+def downgrade():
+    drop_search_indexes(SEARCH_COLUMNS)
@@ -0,0 +1,31 @@
+"""add text search index on doctors
+
+Revision ID: f1a8c6e2b749
+Revises: e9c4a7b3d215
+Create Date: 2026-10-17 19:21:07.340528
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.text_search import create_search_indexes, drop_search_indexes
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a8c6e2b749'
+down_revision = 'e9c4a7b3d215'
+branch_labels = None
+depends_on = None
+
+# The tables and columns api/search.py searched at this revision
+SEARCH_COLUMNS = {
+    'doctors': ('full_name', 'specialization', 'address', 'email'),
+}
+
+
+def upgrade():
+    create_search_indexes(SEARCH_COLUMNS)
+
+
+def downgrade():
+    drop_search_indexes(SEARCH_COLUMNS)
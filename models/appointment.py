@@ -5,6 +5,15 @@ from api import db
 
 class Appointment(BaseModel):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Serve the scheduler's per-transition sweeps in check_appointments
+        db.Index("ix_appointments_status_start_time", "status", "start_time"),
+        db.Index("ix_appointments_status_end_time", "status", "end_time"),
+        # A user's appointments by start time: listings and the dashboard
+        db.Index("ix_appointments_user_id_start_time", "user_id", "start_time", "id"),
+        # A doctor's appointments, and the doctors foreign key
+        db.Index("ix_appointments_doctor_id_start_time", "doctor_id", "start_time"),
+    )
 
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
@@ -23,12 +32,8 @@ class Appointment(BaseModel):
         """
         Convert the Appointment object into a dictionary, using `.getattr()` to avoid attribute errors.
         """
-        doctor_id = getattr(self, "doctor_id", None)
-        doctor = None
-        if doctor_id:
-            from models.doctor import Doctor
-
-            doctor = Doctor.query.get(doctor_id)
+        # List endpoints eager-load the doctor so this costs no extra query
+        doctor = getattr(self, "doctor", None)
 
         return {
             "id": getattr(self, "id", None),
@@ -1,10 +1,17 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import uuid
 from api import db
 from api.config import bucket
 
 
+def local_now():
+    """
+    Return the current wall-clock time the reminders are scheduled in (UTC+1).
+    """
+    return datetime.utcnow() + timedelta(hours=1)
+
+
 class BaseModel(db.Model):
     """
     The BaseModel class for MongoEngine documents.
@@ -1,6 +1,6 @@
-import bcrypt
 from .base_model import BaseModel
 from api import db
+from api.passwords import password_hasher
 
 
 class Doctor(BaseModel):
@@ -58,15 +58,23 @@ class Doctor(BaseModel):
         Hash the doctor's password before saving it.
         """
         if isinstance(self.password, str):
-            self.password = bcrypt.hashpw(
-                self.password.encode("utf-8"), bcrypt.gensalt()
-            ).decode("utf-8")
+            self.password = password_hasher.hash(self.password)
 
     def check_password(self, password):
         """
         Check if the provided password matches the hashed password.
         """
-        return bcrypt.checkpw(password.encode("utf-8"), self.password.encode("utf-8"))
+        return password_hasher.check(password, self.password)
+
+    def rehash_password(self, password):
+        """
+        Re-hash a `password` that just passed `check_password` when the stored
+        hash was made with another cost. Returns True when the hash changed.
+        """
+        if not password_hasher.needs_rehash(self.password):
+            return False
+        self.password = password_hasher.hash(password)
+        return True
 
     def to_dict(self):
         """
@@ -0,0 +1,80 @@
+from datetime import datetime
+from .base_model import BaseModel
+from api import db
+
+
+class EmailOutbox(BaseModel):
+    """
+    An email waiting to be sent.
+
+    Rows are added in the same transaction as the state change that triggers
+    the email and are sent afterwards by the `drain_email_outbox` job, so a
+    crash can neither lose the email nor repeat the state change.
+
+    Attributes:
+        recipient (StringField): The address the email is sent to.
+        name (StringField): The recipient's name used in the greeting.
+        subject (StringField): The email subject.
+        body (TextField): The main body message of the email.
+        template_name (StringField): Template file used to render the email.
+        context (JSON): Additional dynamic fields for the template.
+        status (StringField): pending, sending (claimed by a drain), sent or
+            dead (gave up after retries).
+        attempts (IntField): Number of failed send attempts so far.
+        next_attempt_at (DateTimeField): When the drain job may next try it;
+            while sending, when the claim runs out.
+        last_error (TextField): The error of the last failed attempt.
+        sent_at (DateTimeField): When the email was sent.
+    """
+
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        db.Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    recipient = db.Column(db.String(255), nullable=False)
+    name = db.Column(db.String(100), nullable=True)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    template_name = db.Column(
+        db.String(100), nullable=False, default="email_template.html"
+    )
+    context = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<EmailOutbox {self.subject} to {self.recipient} ({self.status})>"
+
+    @classmethod
+    def enqueue(
+        cls, to, name, subject, body, template_name="email_template.html", **kwargs
+    ):
+        """
+        Add an email to the current session. It is only sent once the session
+        commits; takes the same arguments as `send_email`.
+        """
+        email = cls(
+            recipient=to,
+            name=name,
+            subject=subject,
+            body=body,
+            template_name=template_name,
+            context=kwargs,
+        )
+        db.session.add(email)
+        return email
+
+    def send_kwargs(self):
+        """The arguments to pass to `send_email` for this email."""
+        return {
+            "to": self.recipient,
+            "name": self.name,
+            "subject": self.subject,
+            "body": self.body,
+            "template_name": self.template_name,
+            **(self.context or {}),
+        }
@@ -9,6 +9,12 @@ class MedicalRecords(BaseModel):
     """
 
     __tablename__ = "medical_records"
+    __table_args__ = (
+        # A user's records newest first, the default listing order
+        db.Index(
+            "ix_medical_records_user_id_last_added", "user_id", "last_added", "id"
+        ),
+    )
 
     user_id = db.Column(db.String(50), db.ForeignKey("users.id"), nullable=False)
     record_name = db.Column(db.String(200), nullable=False)
@@ -1,11 +1,69 @@
 import bcrypt
+from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
-from .base_model import BaseModel
+from .base_model import BaseModel, local_now
 from api import db
 
+# Reminder periods and the hours they cover, e.g. 8:00 AM to 11:59 AM for morning
+TIME_SLOTS = {
+    "morning": (8, 12),
+    "afternoon": (12, 18),
+    "night": (18, 24),
+}
+ACTIVE_STATUSES = ("upcoming", "ongoing")
+# How far a reminder may fire before or after its scheduled time
+DOSE_WINDOW = timedelta(minutes=5)
+
+
+def period_for(scheduled_time):
+    """
+    Return the reminder period a time of day falls in, or None outside all slots.
+    """
+    for period, (start, end) in TIME_SLOTS.items():
+        if start <= scheduled_time.hour < end:
+            return period
+    return None
+
+
+def parse_dose(entry):
+    """
+    Return the scheduled time of a `duration` entry, or None when the entry is
+    malformed or its time does not fall inside the period named by `when`.
+    """
+    try:
+        scheduled_time = datetime.strptime(entry["time"], "%H:%M").time()
+        when = entry.get("when").lower()
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return None
+    if period_for(scheduled_time) != when:
+        return None
+    return scheduled_time
+
+
+def next_dose_after(duration, after):
+    """
+    Return the first scheduled dose strictly after `after`, or None when the
+    `duration` list holds no usable entry.
+    """
+    next_dose = None
+    for entry in duration or []:
+        scheduled_time = parse_dose(entry)
+        if scheduled_time is None:
+            continue
+        dose_at = datetime.combine(after.date(), scheduled_time)
+        if dose_at <= after:
+            dose_at += timedelta(days=1)
+        if next_dose is None or dose_at < next_dose:
+            next_dose = dose_at
+    return next_dose
+
 
 class Medication(BaseModel):
     __tablename__ = "medications"
+    __table_args__ = (
+        # A user's medications in listing order
+        db.Index("ix_medications_user_id_created_at", "user_id", "created_at", "id"),
+    )
 
     name = db.Column(db.String(100), nullable=False)
     duration = db.Column(db.JSON, nullable=False)
@@ -15,14 +73,29 @@ class Medication(BaseModel):
     user_id = db.Column(db.String(50), db.ForeignKey("users.id"), nullable=False)
     user = db.relationship("User", back_populates="medications")
     last_sent_period = db.Column(db.String(20), nullable=True)
+    next_dose_at = db.Column(db.DateTime, nullable=True, index=True)
 
     def __init__(self, *args, **kwargs):
-
+        # Set eagerly so the reminder queue sees it before the INSERT runs
+        kwargs.setdefault("status", "upcoming")
         super().__init__(*args, **kwargs)
 
     def __repr__(self):
         return f"<Medication {self.name}>"
 
+    def schedule_next_dose(self, after=None):
+        """
+        Recompute `next_dose_at` from `duration`. Finished or inactive
+        medications are taken off the reminder queue.
+        """
+        if self.status not in ACTIVE_STATUSES or not self.count_left:
+            self.next_dose_at = None
+        else:
+            # Leave room for a dose that is due right now to still be picked up
+            after = after or local_now() - DOSE_WINDOW
+            self.next_dose_at = next_dose_after(self.duration, after)
+        return self.next_dose_at
+
     def to_dict(self):
         return {
             "name": getattr(self, "name", None),
@@ -41,3 +114,22 @@ class Medication(BaseModel):
                 else None
             ),
         }
+
+
+@db.event.listens_for(Medication, "before_insert")
+def schedule_on_insert(mapper, connection, target):
+    if target.next_dose_at is None:
+        target.schedule_next_dose()
+
+
+@db.event.listens_for(Medication, "before_update")
+def schedule_on_update(mapper, connection, target):
+    state = db.inspect(target)
+    if state.attrs.next_dose_at.history.has_changes():
+        # The reminder sweep already set the next dose explicitly
+        return
+    if any(
+        state.attrs[key].history.has_changes()
+        for key in ("duration", "status", "count_left")
+    ):
+        target.schedule_next_dose()